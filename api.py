@@ -0,0 +1,311 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import generate_feeds
+import metrics
+import retention
+import storage
+import tagging
+
+# ------------------------------
+# API Settings
+# ------------------------------
+API_HOST = os.getenv('API_HOST', '127.0.0.1')
+API_PORT = int(os.getenv('API_PORT', '8080'))
+API_CACHE_SIZE = int(os.getenv('API_CACHE_SIZE', '512'))  # Responses kept in memory
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+ARTICLE_COLUMNS = 'id, title, link, description, publication_date, published_at, content_url, source, story_id'
+FEED_NAME_PATTERN = re.compile(r'^([a-z0-9-]+)\.(rss|atom)$')
+FEED_CONTENT_TYPES = {'rss': 'application/rss+xml; charset=utf-8', 'atom': 'application/atom+xml; charset=utf-8'}
+
+class BadRequest(Exception):
+    """A request parameter could not be understood."""
+
+# ------------------------------
+# Cursors
+# ------------------------------
+def encode_cursor(published_at, article_id):
+    """Builds the opaque cursor pointing after an article in a newest-first list."""
+    return f'{published_at}:{article_id}'
+
+def decode_cursor(cursor):
+    """Reverses encode_cursor()."""
+    try:
+        published_at, article_id = cursor.split(':', 1)
+        return int(published_at), int(article_id)
+    except ValueError:
+        raise BadRequest(f'invalid cursor: {cursor!r}')
+
+def parse_limit(params):
+    """Reads the limit parameter, capped at MAX_LIMIT."""
+    try:
+        limit = int(params.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise BadRequest('limit must be an integer')
+    if limit < 1:
+        raise BadRequest('limit must be positive')
+    return min(limit, MAX_LIMIT)
+
+# ------------------------------
+# Queries
+# ------------------------------
+def image_to_null(articles):
+    """Replaces the 'No Image' placeholder with null in article dicts; returns them."""
+    for article in articles:
+        if article['content_url'] == 'No Image':
+            article['content_url'] = None
+    return articles
+
+def rows_to_articles(cursor):
+    """Turns query rows into JSON-ready article dicts."""
+    columns = [column[0] for column in cursor.description]
+    return image_to_null([dict(zip(columns, row)) for row in cursor.fetchall()])
+
+def newest_first_page(params, fetch):
+    """Returns one page of a newest-first article list, paginated by a (published_at, id) cursor.
+
+    fetch(before, limit) returns up to limit article dicts older than the before cursor;
+    one more than the page size is asked for to tell whether a next page exists.
+    """
+    limit = parse_limit(params)
+    before = decode_cursor(params['cursor']) if params.get('cursor') else None
+    articles = image_to_null(fetch(before, limit + 1))
+
+    next_cursor = None
+    if len(articles) > limit:
+        articles = articles[:limit]
+        next_cursor = encode_cursor(articles[-1]['published_at'], articles[-1]['id'])
+    return {'articles': articles, 'next_cursor': next_cursor}
+
+def latest_articles(conn, params, source=None):
+    """Lists articles newest first by publication time, paginated by a (published_at, id) cursor.
+
+    Pages continue from the hot database into the monthly archives. Articles whose date could
+    not be read are not listed here; /articles/since includes them.
+    """
+    return newest_first_page(params, lambda before, limit: retention.query_articles(
+        conn, source=source, before=before, limit=limit))
+
+def coin_articles(conn, params, coin):
+    """Lists the articles tagged with a coin newest first, paginated like latest_articles().
+
+    Read from the article_tags index, so it covers the hot database only.
+    """
+    return newest_first_page(params, lambda before, limit: tagging.articles_for_coin(
+        conn, coin, before=before, limit=limit))
+
+def list_coins(conn, params):
+    """Lists the tagged coins with their article counts."""
+    return {'coins': [{'coin': coin, 'articles': count} for coin, count in tagging.coin_counts(conn)]}
+
+def articles_since(conn, params):
+    """Lists articles stored after a cursor, oldest first, for consumers that follow new articles.
+
+    The cursor is an article id rather than a publication time: a feed may publish an article
+    late with an older date, and following ids never skips it.
+    """
+    limit = parse_limit(params)
+    try:
+        after = int(params.get('cursor') or 0)
+    except ValueError:
+        raise BadRequest(f"invalid cursor: {params['cursor']!r}")
+    articles = rows_to_articles(conn.execute(
+        f'SELECT {ARTICLE_COLUMNS} FROM articles WHERE id > ? ORDER BY id LIMIT ?', (after, limit)))
+    # The cursor always points at the newest article seen, so polling an empty page is cheap
+    return {'articles': articles, 'next_cursor': str(articles[-1]['id'] if articles else after)}
+
+def list_sources(conn, params):
+    """Lists the sources with their article counts."""
+    cursor = conn.execute('SELECT source, COUNT(*) FROM articles GROUP BY source ORDER BY source')
+    return {'sources': [{'source': source, 'articles': count} for source, count in cursor.fetchall()]}
+
+def route(path):
+    """Returns (endpoint name, handler, path arguments) for a request path, or None."""
+    parts = [unquote(part) for part in path.strip('/').split('/')]
+    if parts == ['articles']:
+        return 'latest', latest_articles, ()
+    if parts == ['articles', 'since']:
+        return 'since', articles_since, ()
+    if parts == ['sources']:
+        return 'sources', list_sources, ()
+    if len(parts) == 3 and parts[0] == 'sources' and parts[2] == 'articles':
+        return 'source', latest_articles, (parts[1],)
+    if parts == ['coins']:
+        return 'coins', list_coins, ()
+    if len(parts) == 3 and parts[0] == 'coins' and parts[2] == 'articles':
+        return 'coin', coin_articles, (parts[1],)
+    return None
+
+# ------------------------------
+# Response Cache
+# ------------------------------
+class ResponseCache:
+    """LRU cache of rendered responses, cleared whenever the articles generation changes.
+
+    Commits by other processes are noticed through PRAGMA data_version, which needs no table
+    read; only then is the generation looked up. Commits that don't touch articles (outbox
+    acks, HTML build state) therefore don't flush the cache.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.data_version = None
+        self.generation = None
+
+    def sync(self, conn):
+        """Clears the cache if the articles generation changed since the last check."""
+        data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self.data_version:
+            return
+        self.data_version = data_version
+        generation = storage.get_generation(conn)
+        with self.lock:
+            if generation != self.generation:
+                self.entries.clear()
+                self.generation = generation
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry, generation):
+        """Caches a response rendered at the given generation (dropped if it is no longer current)."""
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+# ------------------------------
+# HTTP Server
+# ------------------------------
+class ApiHandler(BaseHTTPRequestHandler):
+    """Serves the read API as JSON, with ETag / If-None-Match revalidation."""
+    cache = ResponseCache(API_CACHE_SIZE)
+    conn = None  # Shared by the request threads, used under db_lock
+    db_lock = threading.Lock()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path.startswith('/feeds/'):
+            self.send_feed(url.path[len('/feeds/'):])
+            return
+        found = route(url.path)
+        if found is None:
+            self.send_json(404, {'error': 'not found'}, 'unknown')
+            return
+        endpoint, handler, args = found
+
+        with self.db_lock:
+            self.cache.sync(self.conn)
+        entry = self.cache.get(self.path)
+        if entry is None:
+            metrics.inc('api_cache_misses', endpoint=endpoint)
+            params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            try:
+                with self.db_lock:
+                    self.cache.sync(self.conn)
+                    generation = self.cache.generation
+                    payload = handler(self.conn, params, *args)
+            except BadRequest as e:
+                self.send_json(400, {'error': str(e)}, endpoint)
+                return
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            entry = (f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"', body)
+            self.cache.put(self.path, entry, generation)
+        else:
+            metrics.inc('api_cache_hits', endpoint=endpoint)
+
+        etag, body = entry
+        if etag in (tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')):
+            metrics.inc('api_requests', endpoint=endpoint, status=304)
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        metrics.inc('api_requests', endpoint=endpoint, status=200)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')  # Clients may keep it but must revalidate
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_feed(self, name):
+        """Serves a file written by generate_feeds.py, its gzip copy when the client accepts it."""
+        match = FEED_NAME_PATTERN.match(name)
+        path = generate_feeds.feed_path(*match.groups()) if match else None
+        try:
+            stat = os.stat(path) if path else None
+        except FileNotFoundError:
+            stat = None
+        if stat is None:
+            self.send_json(404, {'error': 'not found'}, 'feed')
+            return
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '') and os.path.exists(f'{path}.gz')
+        # Each encoding is a different body, so each gets its own validator
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-gz" if gzipped else ""}"'
+        if etag in (tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')):
+            metrics.inc('api_requests', endpoint='feed', status=304)
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return
+        with open(f'{path}.gz' if gzipped else path, 'rb') as file:
+            body = file.read()
+        metrics.inc('api_requests', endpoint='feed', status=200)
+        self.send_response(200)
+        self.send_header('Content-Type', FEED_CONTENT_TYPES[match.group(2)])
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, payload, endpoint):
+        metrics.inc('api_requests', endpoint=endpoint, status=status)
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    storage.setup_database()
+    ApiHandler.conn = storage.connect(check_same_thread=False)
+    server = ThreadingHTTPServer((API_HOST, API_PORT), ApiHandler)
+    print(f"Read API listening on http://{API_HOST}:{API_PORT}/articles, press Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        ApiHandler.conn.close()
+    print("Read API stopped.")
+
+if __name__ == '__main__':
+    main()
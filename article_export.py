@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import sys
+
+import metrics
+import storage
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow is optional, without it only NDJSON can be exported
+    pyarrow = None
+
+# ------------------------------
+# Export Settings
+# ------------------------------
+EXPORT_DIR = os.getenv('EXPORT_DIR', 'exports')
+EXPORT_BATCH_SIZE = 1000  # Rows fetched from SQLite (and Parquet rows per row group) at a time
+EXPORT_COLUMNS = ['id', 'title', 'link', 'description', 'publication_date', 'published_at', 'content_url',
+                  'source', 'story_id']
+CURSOR_STATE_PREFIX = 'export_cursor:'  # pipeline_state name of each consumer's cursor
+
+# ------------------------------
+# Reading
+# ------------------------------
+# Exports follow article ids rather than publication times: ids only grow, and a feed may
+# publish an article late with an older date. The rows are streamed from one SELECT in
+# batches, so memory stays the same however many articles are exported, and the statement
+# reads one snapshot of the database while the ingester keeps writing.
+def iter_batches(conn, after_id=0):
+    """Yields lists of up to EXPORT_BATCH_SIZE article dicts with an id above after_id, in id order."""
+    cursor = conn.execute(f'SELECT {", ".join(EXPORT_COLUMNS)} FROM articles WHERE id > ? ORDER BY id', (after_id,))
+    while True:
+        rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+        if not rows:
+            return
+        yield [dict(zip(EXPORT_COLUMNS, row)) for row in rows]
+
+def iter_batches_from(first, rest):
+    """Puts back the batch taken to name the file."""
+    yield first
+    yield from rest
+
+def get_cursor(conn, name):
+    """Returns the id of the last article exported for a consumer, 0 if it has exported nothing."""
+    return storage.get_state(conn, CURSOR_STATE_PREFIX + name, 0)
+
+def set_cursor(conn, name, last_id):
+    """Records the id of the last article exported for a consumer."""
+    with conn:
+        storage.set_state(conn, CURSOR_STATE_PREFIX + name, last_id)
+
+# ------------------------------
+# Writers
+# ------------------------------
+def write_ndjson(batches, file):
+    """Writes one JSON object per line; returns (rows written, last id)."""
+    count, last_id = 0, None
+    for batch in batches:
+        file.write(''.join(json.dumps(article, ensure_ascii=False) + '\n' for article in batch))
+        count += len(batch)
+        last_id = batch[-1]['id']
+    return count, last_id
+
+def parquet_schema():
+    """Returns the Parquet schema of EXPORT_COLUMNS: integer ids and times, text for the rest."""
+    return pyarrow.schema([
+        (column, pyarrow.int64() if column in ('id', 'published_at') else pyarrow.string())
+        for column in EXPORT_COLUMNS
+    ])
+
+def write_parquet(batches, path):
+    """Writes a Parquet file with one row group per batch; returns (rows written, last id)."""
+    schema = parquet_schema()
+    count, last_id = 0, None
+    with pyarrow.parquet.ParquetWriter(path, schema, compression='zstd') as writer:
+        for batch in batches:
+            writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+            last_id = batch[-1]['id']
+    return count, last_id
+
+# ------------------------------
+# Exports
+# ------------------------------
+def export_articles(conn, file_format='ndjson', name='default', full=False, output=None):
+    """Exports the articles added since the consumer's last export; returns (path, rows written).
+
+    The file is written under a temporary name and renamed when complete, and the cursor only
+    moves after that, so an interrupted export is simply repeated by the next run. With
+    output='-' NDJSON goes to stdout. full=True exports everything and leaves the cursor alone;
+    its file is named articles-<name>-full-<last id>, apart from the incremental files.
+    """
+    if file_format == 'parquet' and pyarrow is None:
+        raise RuntimeError('Parquet export needs pyarrow (pip install pyarrow)')
+    after_id = 0 if full else get_cursor(conn, name)
+    batches = iter_batches(conn, after_id)
+
+    if output == '-':
+        if file_format != 'ndjson':
+            raise ValueError('only NDJSON can be written to stdout')
+        count, last_id = write_ndjson(batches, sys.stdout)
+    else:
+        first = next(batches, None)
+        if first is None:
+            return None, 0
+        default_name = output is None
+        if default_name:
+            # Incremental files are named after their first article, full ones after their last
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+            label = 'full' if full else first[0]['id']
+            output = os.path.join(EXPORT_DIR, f"articles-{name}-{label}.{file_format}")
+        temporary = output + '.part'
+        batches = iter_batches_from(first, batches)
+        if file_format == 'parquet':
+            count, last_id = write_parquet(batches, temporary)
+        else:
+            with open(temporary, 'w', encoding='utf-8') as file:
+                count, last_id = write_ndjson(batches, file)
+        if default_name and full:
+            output = os.path.join(EXPORT_DIR, f"articles-{name}-full-{last_id}.{file_format}")
+        os.replace(temporary, output)
+
+    metrics.inc('articles_exported', count, format=file_format)
+    if count and not full:
+        set_cursor(conn, name, last_id)
+    return output, count
+
+def main():
+    parser = argparse.ArgumentParser(description='Export articles as NDJSON or Parquet, incrementally by default.')
+    parser.add_argument('--format', choices=['ndjson', 'parquet'], default='ndjson')
+    parser.add_argument('--name', default='default', help='consumer name, each consumer keeps its own cursor')
+    parser.add_argument('--full', action='store_true', help='export every article and leave the cursor alone')
+    parser.add_argument('--output', help="output file, '-' for stdout (NDJSON only)")
+    args = parser.parse_args()
+
+    storage.setup_database()
+    conn = storage.connect()
+    try:
+        with metrics.stage('data_export'):
+            path, count = export_articles(conn, args.format, args.name, args.full, args.output)
+    finally:
+        conn.close()
+        metrics.write_metrics_file('data_export')
+    if args.output == '-':
+        return
+    if count:
+        print(f"{count} articles exported to {path}")
+    else:
+        print("No new articles to export.")
+
+if __name__ == '__main__':
+    main()
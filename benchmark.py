@@ -0,0 +1,363 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+import feedparser
+import requests
+
+import discord_delivery
+import generate_discord_notifications
+import generate_feeds
+import generate_html_page
+import main as ingester
+import outbox
+import routing
+import storage
+
+# ------------------------------
+# Benchmark Settings
+# ------------------------------
+DEFAULT_ENTRIES = 50  # Entries per fixture feed, raise to thousands for scale runs
+DEFAULT_OUTPUT_PATH = 'bench_results.json'
+FIXTURE_IMAGE_SIZE = 64  # Pixels per side of the generated article images
+
+# ------------------------------
+# Fixture Feeds
+# ------------------------------
+# Fixtures reproduce the shape of each registered source: its date format, where it puts the
+# article image and whether descriptions carry HTML. They are derived from the FEEDS registry,
+# so a new source gets a fixture without changes here.
+WORDS = ('bitcoin ethereum solana etf regulators market rally liquidity staking defi exchange halving '
+         'miners stablecoin treasury layer-2 token launch governance custody price analysts investors '
+         'volume futures options funding whale wallet bridge exploit hack upgrade mainnet testnet '
+         'validators fees gas airdrop listing delisting lawsuit sec cftc approval inflow outflow '
+         'institutional retail adoption payments lightning ordinals nft memecoin oracle lending yield').split()
+
+# Sources whose feeds don't use the common "+0000" RFC 822 dates
+DATE_FORMATS = {
+    'Investing.com': '%Y-%m-%d %H:%M:%S',
+    'The Defiant': '%a, %d %b %Y %H:%M:%S GMT',
+    'Bitcoin Magazine': '%a, %d %b %Y %H:%M:%S GMT',
+}
+
+def fixture_date(feed_config, when):
+    """Formats a timestamp the way the source's feed does."""
+    return when.strftime(DATE_FORMATS.get(feed_config['source'], '%a, %d %b %Y %H:%M:%S +0000'))
+
+def fixture_text(seed, length):
+    """Returns deterministic filler text that differs from seed to seed."""
+    generator = random.Random(seed)
+    return ' '.join(generator.choice(WORDS) for _ in range(length))
+
+def fixture_item(feed_config, slug, index, when, image_base):
+    """Renders one <item> in the source's format."""
+    image_url = f'{image_base}/{slug}/{index}.png'
+    description = f'<p>{fixture_text(f"{slug}-{index}-a", 40)}. {fixture_text(f"{slug}-{index}-b", 25)}.</p>'
+    extractor = feed_config['image_extractor']
+    media = ''
+    if extractor is ingester.media_content_image:
+        media = f'<media:content url="{image_url}" medium="image"/>'
+    elif extractor is ingester.media_thumbnail_image:
+        media = f'<media:thumbnail url="{image_url}"/>'
+    elif extractor is ingester.enclosure_image:
+        media = f'<enclosure url="{image_url}" type="image/jpeg" length="0"/>'
+    elif extractor is ingester.description_image:
+        description = f'<img src="{image_url}"/>' + description
+    return (
+        '<item>'
+        f'<title>{escape(feed_config["source"])} {index}: {fixture_text(f"{slug}-{index}", 8)}</title>'
+        f'<link>https://news.example.com/{slug}/{index}</link>'
+        f'<description><![CDATA[{description}]]></description>'
+        f'<pubDate>{fixture_date(feed_config, when)}</pubDate>'
+        f'{media}'
+        '</item>'
+    )
+
+def build_fixture(feed_config, entries, now, image_base):
+    """Builds an RSS document for a source with the given number of entries, newest first."""
+    slug = generate_html_page.section_slug(feed_config['source'])
+    items = ''.join(fixture_item(feed_config, slug, entries - i, now - timedelta(minutes=i), image_base)
+                    for i in range(entries))
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/"><channel>'
+        f'<title>{escape(feed_config["source"])}</title>'
+        f'<image><url>{image_base}/{slug}/logo.png</url></image>'
+        f'{items}</channel></rss>'
+    ).encode('utf-8')
+
+def fixture_image(path):
+    """Renders a small single-colour PNG whose colour depends on the path."""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    color = hashlib.sha1(path.encode('utf-8')).digest()[:3]
+    rows = (b'\x00' + color * FIXTURE_IMAGE_SIZE) * FIXTURE_IMAGE_SIZE
+    header = struct.pack('>IIBBBBB', FIXTURE_IMAGE_SIZE, FIXTURE_IMAGE_SIZE, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(rows))
+            + chunk(b'IEND', b''))
+
+# ------------------------------
+# Local Stand-In Servers
+# ------------------------------
+class FeedHandler(BaseHTTPRequestHandler):
+    """Serves fixture feeds with ETag support, and the images they link to."""
+    feeds = {}
+
+    def do_GET(self):
+        if self.path.startswith('/images/'):
+            body = fixture_image(self.path)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        body = self.feeds.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/rss+xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """Stands in for a Discord webhook with configurable latency and 429 responses."""
+    latency_seconds = 0.0
+    rate_limit_every = 0  # Every Nth request gets a 429, 0 disables
+    retry_after_seconds = 0.05
+    lock = threading.Lock()
+    requests_seen = 0
+    embeds_seen = 0
+    rate_limited = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        time.sleep(self.latency_seconds)
+        with self.lock:
+            WebhookHandler.requests_seen += 1
+            limited = self.rate_limit_every and WebhookHandler.requests_seen % self.rate_limit_every == 0
+            if limited:
+                WebhookHandler.rate_limited += 1
+            else:
+                WebhookHandler.embeds_seen += len(body.get('embeds', []))
+        if limited:
+            payload = json.dumps({'message': 'You are being rate limited.', 'retry_after': self.retry_after_seconds,
+                                  'global': False}).encode()
+            self.send_response(429)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        self.send_response(204)
+        self.send_header('X-RateLimit-Limit', '5')
+        self.send_header('X-RateLimit-Remaining', '4')
+        self.send_header('X-RateLimit-Reset-After', '0.0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def start_server(handler):
+    """Starts a threaded HTTP server on a free local port; returns (server, base_url)."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+# ------------------------------
+# Measurements
+# ------------------------------
+def percentile(values, fraction):
+    """Returns the given percentile of a list of numbers (nearest rank)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def stage_result(seconds, items, latencies=None, **extra):
+    """Builds the report entry of one stage."""
+    result = {
+        'seconds': round(seconds, 6),
+        'items': items,
+        'items_per_second': round(items / seconds, 2) if seconds > 0 else None,
+    }
+    if latencies:
+        result['latency_p50_ms'] = round(percentile(latencies, 0.5) * 1000, 3)
+        result['latency_p95_ms'] = round(percentile(latencies, 0.95) * 1000, 3)
+    result.update(extra)
+    return result
+
+def timed_call(latencies, function, *args):
+    """Calls function, appending how long it took to latencies; returns its result."""
+    started = time.perf_counter()
+    try:
+        return function(*args)
+    finally:
+        latencies.append(time.perf_counter() - started)
+
+def run_benchmark(entries, webhook_latency, rate_limit_every):
+    """Runs every stage against the local servers in a scratch directory; returns the report."""
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    feed_server, feed_base = start_server(FeedHandler)
+    FeedHandler.feeds = {}
+    feeds = []
+    for feed_config in ingester.FEEDS:
+        path = f'/feeds/{generate_html_page.section_slug(feed_config["source"])}.xml'
+        FeedHandler.feeds[path] = build_fixture(feed_config, entries, now, feed_base + '/images')
+        feeds.append((feed_config, path))
+
+    WebhookHandler.latency_seconds = webhook_latency
+    WebhookHandler.requests_seen = WebhookHandler.embeds_seen = WebhookHandler.rate_limited = 0
+    WebhookHandler.rate_limit_every = rate_limit_every
+    webhook_server, webhook_base = start_server(WebhookHandler)
+    local_feeds = [dict(feed_config, url=feed_base + path) for feed_config, path in feeds]
+
+    stages = {}
+    session = requests.Session()
+    try:
+        # Fetch: one sequential GET per feed, to measure transfer per source
+        bodies = []
+        latencies = []
+        started = time.perf_counter()
+        for feed_config in local_feeds:
+            request_started = time.perf_counter()
+            response = session.get(feed_config['url'], timeout=ingester.FEED_TIMEOUT_SECONDS)
+            latencies.append(time.perf_counter() - request_started)
+            bodies.append((feed_config, response.content))
+        stages['fetch'] = stage_result(time.perf_counter() - started, len(bodies), latencies,
+                                       bytes=sum(len(body) for _, body in bodies))
+
+        parse_latencies = []
+        started = time.perf_counter()
+        parsed = [(feed_config, timed_call(parse_latencies, feedparser.parse, body)) for feed_config, body in bodies]
+        stages['parse'] = stage_result(time.perf_counter() - started, sum(len(feed.entries) for _, feed in parsed),
+                                       parse_latencies)
+
+        normalize_latencies = []
+        started = time.perf_counter()
+        batches = [timed_call(normalize_latencies, ingester.normalize_entries, feed_config, feed)
+                   for feed_config, feed in parsed]
+        stages['normalize'] = stage_result(time.perf_counter() - started, sum(len(rows) for rows in batches),
+                                           normalize_latencies)
+
+        # One daemon cycle per feed: its articles are stored, exported and published before the next
+        # feed's arrive, so each stage gets one latency sample per batch
+        routes = [routing.Route(routing.DEFAULT_TARGET, webhook_base + '/webhook')]
+        cycle_latencies = {stage: [] for stage in ('insert', 'export', 'render', 'feeds')}
+        inserted = queued = 0
+        storage.setup_database()
+        conn = storage.connect()
+
+        def store(rows):
+            with conn:
+                return ingester.store_articles(conn, rows)
+
+        try:
+            for rows in batches:
+                inserted += len(timed_call(cycle_latencies['insert'], store, rows))
+                queued += timed_call(cycle_latencies['export'], outbox.enqueue_unsent, conn, routes)
+                timed_call(cycle_latencies['render'], generate_html_page.build_site, conn)
+                timed_call(cycle_latencies['feeds'], generate_feeds.build_feeds, conn)
+            stages['insert'] = stage_result(sum(cycle_latencies['insert']), inserted, cycle_latencies['insert'])
+
+            # Full pipeline on a fresh database: concurrent fetch, parse, normalize and insert
+            conn.close()
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(storage.DATABASE_PATH + suffix):
+                    os.remove(storage.DATABASE_PATH + suffix)
+            storage.setup_database()
+            conn = storage.connect()
+            started = time.perf_counter()
+            ingested = ingester.ingest(local_feeds)
+            stages['ingest'] = stage_result(time.perf_counter() - started, len(ingested))
+
+            started = time.perf_counter()
+            ingester.ingest(local_feeds)
+            stages['ingest_unchanged'] = stage_result(time.perf_counter() - started, len(local_feeds))
+
+            stages['export'] = stage_result(sum(cycle_latencies['export']), queued, cycle_latencies['export'])
+            stages['render'] = stage_result(sum(cycle_latencies['render']), inserted, cycle_latencies['render'])
+            stages['feeds'] = stage_result(sum(cycle_latencies['feeds']), inserted, cycle_latencies['feeds'])
+
+            # The fresh database has nothing queued yet
+            outbox.enqueue_unsent(conn, routes)
+            client = discord_delivery.WebhookClient(webhook_base + '/webhook')
+            send_latencies = []
+            timed_send = client.send
+
+            def send(embeds):
+                return timed_call(send_latencies, timed_send, embeds)
+            client.send = send
+            started = time.perf_counter()
+            sent = generate_discord_notifications.send_messages_from_outbox(conn, client)
+            stages['send'] = stage_result(time.perf_counter() - started, sent, send_latencies,
+                                          messages=len(send_latencies), rate_limited=WebhookHandler.rate_limited)
+            client.close()
+        finally:
+            conn.close()
+    finally:
+        session.close()
+        feed_server.shutdown()
+        webhook_server.shutdown()
+
+    return {
+        'timestamp': now.isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'feeds': len(local_feeds),
+        'entries_per_feed': entries,
+        'webhook_latency_seconds': webhook_latency,
+        'rate_limit_every': rate_limit_every,
+        'stages': stages,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every pipeline stage against local stand-in servers.')
+    parser.add_argument('--entries', type=int, default=DEFAULT_ENTRIES, help='entries per fixture feed')
+    parser.add_argument('--webhook-latency', type=float, default=0.0, help='seconds the fake webhook waits per request')
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='answer every Nth webhook request with a 429')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_PATH, help='where to write the JSON results')
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    original_dir = os.getcwd()
+    # Database, HTML and archive files all use relative paths, so they land in the scratch directory
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            report = run_benchmark(args.entries, args.webhook_latency, args.rate_limit_every)
+        finally:
+            os.chdir(original_dir)
+
+    with open(output_path, 'w') as file:
+        json.dump(report, file, indent=4)
+    for name, result in report['stages'].items():
+        print(f"{name:<17} {result['seconds']:>10.4f}s  {result['items']:>7} items  {result['items_per_second'] or 0:>12} items/s")
+    print(f"Results written to {output_path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+import os
+import signal
+import threading
+import time
+
+import generate_discord_notifications
+import generate_feeds
+import generate_html_page
+import main as ingester
+import metrics
+import outbox
+import retention
+import routing
+import storage
+
+# ------------------------------
+# Scheduler Settings
+# ------------------------------
+MIN_POLL_SECONDS = float(os.getenv('MIN_POLL_SECONDS', '60'))
+MAX_POLL_SECONDS = float(os.getenv('MAX_POLL_SECONDS', '3600'))
+DEFAULT_POLL_SECONDS = 300  # Used for sources without enough history
+HISTORY_SIZE = 20  # Recent articles used to estimate a source's publishing rate
+POLLS_PER_ARTICLE = 2  # Aim to poll about twice per typical gap between articles
+SPEEDUP_FACTOR = 0.75  # Interval multiplier after a poll that found new articles
+SLOWDOWN_FACTOR = 1.5  # Interval multiplier after a poll that found nothing
+IDLE_SECONDS = 30  # Longest sleep between ticks, so outbox retries are picked up
+RETENTION_INTERVAL_SECONDS = 24 * 3600  # How often old articles are moved to the archives
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # Serves /metrics on this port when set
+
+# ------------------------------
+# Adaptive Poll Scheduler
+# ------------------------------
+def clamp_interval(seconds):
+    """Keeps a poll interval between MIN_POLL_SECONDS and MAX_POLL_SECONDS."""
+    return min(MAX_POLL_SECONDS, max(MIN_POLL_SECONDS, seconds))
+
+def estimate_interval(conn, source):
+    """Estimates a poll interval from the median gap between a source's recent articles."""
+    cursor = conn.execute('''
+        SELECT published_at FROM articles WHERE source = ? AND published_at IS NOT NULL ORDER BY id DESC LIMIT ?
+    ''', (source, HISTORY_SIZE))
+    times = sorted(published_at for published_at, in cursor.fetchall())
+    gaps = sorted(later - earlier for earlier, later in zip(times, times[1:]) if later > earlier)
+    if not gaps:
+        return DEFAULT_POLL_SECONDS
+    return clamp_interval(gaps[len(gaps) // 2] / POLLS_PER_ARTICLE)
+
+class PollScheduler:
+    """Decides which feeds are due, polling busy sources often and quiet ones rarely.
+
+    Intervals start from each source's publishing history and then shrink after polls
+    that found new articles and grow after polls that found none.
+    """
+
+    def __init__(self, feeds, conn):
+        now = time.monotonic()
+        self.feeds = {feed_config['source']: feed_config for feed_config in feeds}
+        self.intervals = {source: estimate_interval(conn, source) for source in self.feeds}
+        self.next_poll = {source: now for source in self.feeds}
+
+    def due_feeds(self, now):
+        """Returns the feeds whose next poll time has come."""
+        return [self.feeds[source] for source, at in self.next_poll.items() if at <= now]
+
+    def record(self, polled_feeds, new_rows, now):
+        """Adjusts the intervals of the polled feeds from how many new articles they had."""
+        new_counts = {}
+        for row in new_rows:
+            new_counts[row['source']] = new_counts.get(row['source'], 0) + 1
+        for feed_config in polled_feeds:
+            source = feed_config['source']
+            factor = SPEEDUP_FACTOR if new_counts.get(source) else SLOWDOWN_FACTOR
+            self.intervals[source] = clamp_interval(self.intervals[source] * factor)
+            self.next_poll[source] = now + self.intervals[source]
+
+    def seconds_until_next(self, now):
+        """Returns how long until the next feed is due."""
+        return max(0.0, min(self.next_poll.values()) - now)
+
+# ------------------------------
+# Pipeline Daemon
+# ------------------------------
+def run_stage(name, stage, *args):
+    """Runs one pipeline stage; a failing stage is reported and does not stop the daemon."""
+    try:
+        with metrics.stage(name):
+            return stage(*args)
+    except Exception as e:
+        print(f"{name} stage failed: {e}")
+        metrics.inc('stage_failures', stage=name)
+        return None
+
+def run(stop_event):
+    """Runs ingest, export, notify, render and feeds until stop_event is set, and retention once a day."""
+    storage.setup_database()
+    conn = storage.connect()
+    routes = routing.load_routes()
+    clients = generate_discord_notifications.open_clients(routes)
+    if not clients:
+        print("No Discord webhook is configured, the notify stage is disabled.")
+    scheduler = PollScheduler(ingester.FEEDS, conn)
+    server = metrics.serve(METRICS_PORT) if METRICS_PORT else None
+    next_retention = time.monotonic()
+
+    try:
+        # Queues articles stored by a run that stopped before exporting them, which no later
+        # ingest would pick up until a feed brings something new
+        run_stage('export', outbox.enqueue_unsent, conn, routes)
+        while not stop_event.is_set():
+            now = time.monotonic()
+            due = scheduler.due_feeds(now)
+            if due:
+                new_rows = run_stage('ingest', ingester.ingest, due) or []
+                scheduler.record(due, new_rows, time.monotonic())
+                if new_rows:
+                    print(f"{len(new_rows)} new articles from {len(due)} polled feeds")
+                    run_stage('export', outbox.enqueue_unsent, conn, routes)
+                    run_stage('render', generate_html_page.build_site, conn)
+                    run_stage('feeds', generate_feeds.build_feeds, conn)
+            if clients:
+                # Runs every tick so items waiting for a retry go out as soon as they are ready
+                run_stage('notify', generate_discord_notifications.deliver, routes, clients)
+            if time.monotonic() >= next_retention:
+                if run_stage('retention', retention.run_retention, conn):
+                    run_stage('render', generate_html_page.build_site, conn)
+                    run_stage('feeds', generate_feeds.build_feeds, conn)
+                next_retention = time.monotonic() + RETENTION_INTERVAL_SECONDS
+            metrics.write_metrics_file('daemon')
+            stop_event.wait(min(IDLE_SECONDS, scheduler.seconds_until_next(time.monotonic())))
+    finally:
+        if server is not None:
+            server.shutdown()
+        for client in clients.values():
+            client.close()
+        conn.close()
+
+def main():
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+    print("Daemon started, press Ctrl+C to stop.")
+    run(stop_event)
+    print("Daemon stopped.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import re
+import time
+from functools import lru_cache
+
+# ------------------------------
+# Date Formats
+# ------------------------------
+# RFC 822 / 2822 as used by RSS: "Fri, 12 Jan 2024 13:47:21 +0000", "Tue, 12 Dec 2023 14:27:00 GMT"
+RFC822_PATTERN = re.compile(
+    r'\s*(?:[A-Za-z]+,?\s*)?(\d{1,2})\s+([A-Za-z]{3})[A-Za-z]*\.?\s+(\d{2,4})'
+    r'\s+(\d{1,2}):(\d{2})(?::(\d{2}))?\s*([A-Za-z]+|[+-]\d{2}:?\d{2})?'
+)
+# ISO 8601 / RFC 3339 as used by Atom and some RSS feeds: "2024-01-12T13:47:21Z", "2024-01-12 13:47:21"
+ISO8601_PATTERN = re.compile(
+    r'\s*(\d{4})-(\d{2})-(\d{2})(?:[Tt ](\d{2}):(\d{2})(?::(\d{2})(?:[.,]\d+)?)?)?'
+    r'\s*([Zz]|[+-]\d{2}(?::?\d{2})?|[A-Za-z]+)?\s*$'
+)
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+# Named zones allowed by RFC 822; dates without a zone are taken as UTC
+ZONE_HOURS = {
+    'UT': 0, 'UTC': 0, 'GMT': 0, 'Z': 0,
+    'EST': -5, 'EDT': -4, 'CST': -6, 'CDT': -5, 'MST': -7, 'MDT': -6, 'PST': -8, 'PDT': -7,
+}
+DISPLAY_FORMAT = '%Y-%m-%d %H:%M:%S'  # publication_date text, always UTC
+
+# ------------------------------
+# Parsing
+# ------------------------------
+@lru_cache(maxsize=256)
+def zone_offset(zone):
+    """Returns the UTC offset of a zone token in seconds, or None if it is unknown.
+
+    Feeds repeat the same one or two zones in every entry, so the result is memoized.
+    """
+    if not zone:
+        return 0
+    if zone[0] in '+-':
+        digits = zone[1:].replace(':', '')
+        if not digits.isdigit() or len(digits) not in (2, 4):
+            return None
+        hours, minutes = int(digits[:2]), int(digits[2:] or 0)
+        offset = hours * 3600 + minutes * 60
+        return -offset if zone[0] == '-' else offset
+    hours = ZONE_HOURS.get(zone.upper())
+    return None if hours is None else hours * 3600
+
+def days_from_civil(year, month, day):
+    """Returns the number of days from 1970-01-01 to a proleptic Gregorian date."""
+    year -= month <= 2
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+def days_in_month(year, month):
+    """Returns the length of a month."""
+    if month == 2:
+        return 29 if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0) else 28
+    return 30 if month in (4, 6, 9, 11) else 31
+
+def to_epoch(year, month, day, hour, minute, second, offset):
+    """Converts broken-down local time at a UTC offset to epoch seconds, or None if it is not a valid time."""
+    if not (1 <= month <= 12 and 1 <= day <= days_in_month(year, month)
+            and hour <= 23 and minute <= 59 and second <= 60):
+        return None
+    # A leap second is folded into the next one, as time.gmtime() would
+    return days_from_civil(year, month, day) * 86400 + hour * 3600 + minute * 60 + second - offset
+
+def parse_timestamp(text):
+    """Parses an RFC 822 or ISO 8601 date into integer UTC epoch seconds; returns None if it can't."""
+    if not text:
+        return None
+    match = ISO8601_PATTERN.match(text)
+    if match:
+        year, month, day, hour, minute, second, zone = match.groups()
+        month = int(month)
+    else:
+        match = RFC822_PATTERN.match(text)
+        if not match:
+            return None
+        day, month_name, year, hour, minute, second, zone = match.groups()
+        month = MONTHS.get(month_name.lower())
+        if month is None:
+            return None
+        if len(year) == 2:
+            year = ('20' if int(year) < 50 else '19') + year
+    offset = zone_offset(zone)
+    if offset is None:
+        return None
+    return to_epoch(int(year), month, int(day), int(hour or 0), int(minute or 0), int(second or 0), offset)
+
+def format_timestamp(timestamp):
+    """Formats epoch seconds as the 'YYYY-MM-DD HH:MM:SS' UTC text shown to readers."""
+    if timestamp is None:
+        return None
+    return time.strftime(DISPLAY_FORMAT, time.gmtime(timestamp))
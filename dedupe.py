@@ -0,0 +1,190 @@
+import hashlib
+import html
+import re
+import struct
+import time
+
+# ------------------------------
+# Near-Duplicate Detection Settings
+# ------------------------------
+HASH_COUNT = 160  # MinHash functions per article
+ROWS_PER_BAND = 4  # The signature is split into 40 bands of 4 values for the LSH lookup
+BAND_COUNT = HASH_COUNT // ROWS_PER_BAND
+MIN_JACCARD = 0.5  # Articles sharing at least this share of their words are the same story
+MIN_TITLE_WORDS = 4  # Shorter titles are compared together with their description
+STORY_WINDOW_SECONDS = 3 * 86400  # Articles published further apart are never the same story
+MERSENNE_PRIME = (1 << 61) - 1
+
+STOP_WORDS = {
+    'a', 'after', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have', 'in', 'is',
+    'it', 'its', 'new', 'of', 'on', 'or', 's', 'that', 'the', 'this', 'to', 'was', 'will', 'with',
+}
+NUMBER_WORDS = {
+    'one': '1', 'two': '2', 'three': '3', 'four': '4', 'five': '5', 'six': '6', 'seven': '7', 'eight': '8',
+    'nine': '9', 'ten': '10', 'thousand': 'k', 'million': 'm', 'billion': 'b', 'trillion': 't',
+}
+
+def make_hash_parameters():
+    """Returns the (a, b) coefficients of the HASH_COUNT universal hash functions, fixed across runs."""
+    parameters = []
+    for index in range(HASH_COUNT):
+        digest = hashlib.blake2b(f'minhash-{index}'.encode(), digest_size=16).digest()
+        a, b = struct.unpack('>2Q', digest)
+        parameters.append((a % (MERSENNE_PRIME - 1) + 1, b % MERSENNE_PRIME))
+    return parameters
+
+HASH_PARAMETERS = make_hash_parameters()
+
+# ------------------------------
+# Word Sets
+# ------------------------------
+# Headlines are short, so the same story told by two sources differs in a few words out of
+# ten. Stories are therefore compared by the Jaccard similarity of their normalized word sets,
+# which stays high under such edits, and candidates are found through a MinHash LSH index.
+def tokenize(title, description):
+    """Returns the normalized words of an article, without markup and stop words.
+
+    Words are compared without case, dots ("U.S."), thousands separators, plural s and
+    written-out numbers, so "US" and "U.S." or "$1B" and "$1 billion" are the same words.
+    """
+    text = html.unescape(re.sub('<.*?>', ' ', f"{title or ''} {description or ''}")).lower()
+    text = re.sub(r'(?<=[a-z0-9])[.,](?=[a-z0-9])', '', text)
+    text = re.sub(r'(?<=\d)(k|m|bn|b|t)\b', lambda match: ' ' + match.group(1)[0], text)
+    words = []
+    for word in re.findall(r'[a-z0-9$]+', text):
+        word = NUMBER_WORDS.get(word, word)
+        if word in STOP_WORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+def story_words(title, description):
+    """Returns the word set an article is compared by: its title, with the description for short titles."""
+    words = set(tokenize(title, None))
+    if len(words) < MIN_TITLE_WORDS:
+        words.update(tokenize(None, description))
+    return words
+
+def jaccard(first, second):
+    """Returns the Jaccard similarity of two word sets."""
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+# ------------------------------
+# MinHash Index
+# ------------------------------
+def word_hash(word):
+    """Returns a stable 64-bit hash of a word."""
+    return int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def minhash(words):
+    """Computes the MinHash signature of a word set."""
+    hashes = [word_hash(word) for word in words]
+    return [min((a * value + b) % MERSENNE_PRIME for value in hashes) for a, b in HASH_PARAMETERS]
+
+def bands(words):
+    """Returns the LSH band values of a word set, or none for an empty set.
+
+    Two sets with Jaccard similarity J share a band with probability 1 - (1 - J^4)^40: 92% at
+    MIN_JACCARD and 98% at 0.55, but 6% at 0.2 and 0.4% at 0.1. Headlines that only share
+    common words ("bitcoin", "price") therefore rarely become candidates.
+    """
+    if not words:
+        return []
+    signature = minhash(words)
+    result = []
+    for band in range(BAND_COUNT):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(struct.pack(f'>{ROWS_PER_BAND}Q', *rows), digest_size=8).digest()
+        result.append((band, int.from_bytes(digest, 'big', signed=True)))
+    return result
+
+def index_article(conn, link, words, published_at):
+    """Stores an article's word set and LSH bands (committed by the caller).
+
+    Bands are keyed by publication time, so lookups only read the story window. An article
+    indexed without a time keeps its word set but is never a candidate.
+    """
+    conn.execute('INSERT OR REPLACE INTO article_words (link, words) VALUES (?, ?)', (link, ' '.join(sorted(words))))
+    if published_at is None:
+        return
+    conn.executemany('''
+        INSERT OR IGNORE INTO minhash_bands (band, value, published_at, article_id)
+        SELECT ?, ?, ?, id FROM articles WHERE link = ?
+    ''', [(band, value, published_at, link) for band, value in bands(words)])
+
+def index_stored(conn):
+    """Indexes every stored article without changing its story (committed by the caller)."""
+    cursor = conn.execute('SELECT link, title, description, published_at FROM articles')
+    while True:
+        rows = cursor.fetchmany(1000)
+        if not rows:
+            return
+        for link, title, description, published_at in rows:
+            index_article(conn, link, story_words(title, description), published_at)
+
+def unindex_articles(conn, ids):
+    """Removes the LSH bands of articles about to be deleted (committed by the caller).
+
+    The bands are recomputed from the stored word sets, so each delete is a primary key lookup.
+    """
+    placeholders = ','.join('?' * len(ids))
+    cursor = conn.execute(f'''
+        SELECT a.id, w.words FROM articles a JOIN article_words w ON w.link = a.link WHERE a.id IN ({placeholders})
+    ''', ids)
+    conn.executemany('DELETE FROM minhash_bands WHERE band = ? AND value = ? AND article_id = ?',
+                     [(band, value, article_id)
+                      for article_id, words in cursor.fetchall() for band, value in bands(set(words.split()))])
+
+# ------------------------------
+# Story Clustering
+# ------------------------------
+def find_candidates(conn, words, published_at):
+    """Returns the ids of the articles published within the story window that share an LSH band with words."""
+    candidates = set()
+    for band, value in bands(words):
+        cursor = conn.execute('''
+            SELECT article_id FROM minhash_bands
+            WHERE band = ? AND value = ? AND published_at BETWEEN ? AND ?
+        ''', (band, value, published_at - STORY_WINDOW_SECONDS, published_at + STORY_WINDOW_SECONDS))
+        candidates.update(article_id for article_id, in cursor.fetchall())
+    return candidates
+
+def find_story(conn, words, published_at):
+    """Returns the story_id of the most similar article published around the same time, or None."""
+    candidates = find_candidates(conn, words, published_at)
+    if not candidates:
+        return None
+
+    best = None
+    placeholders = ','.join('?' * len(candidates))
+    cursor = conn.execute(f'''
+        SELECT w.words, COALESCE(a.story_id, a.link)
+        FROM articles a JOIN article_words w ON w.link = a.link
+        WHERE a.id IN ({placeholders})
+    ''', list(candidates))
+    for stored, story_id in cursor.fetchall():
+        similarity = jaccard(words, set(stored.split()))
+        if similarity >= MIN_JACCARD and (best is None or similarity > best[0]):
+            best = (similarity, story_id)
+    return best[1] if best else None
+
+def assign_stories(conn, rows):
+    """Indexes newly stored articles and groups them into story clusters.
+
+    An article that matches no stored story starts its own, with its link as story_id,
+    so the first article of each story is the one with story_id = link. Articles without
+    a publication date are clustered by the time they are stored.
+    """
+    now = int(time.time())
+    for row in rows:
+        words = story_words(row['title'], row['description'])
+        published_at = row.get('published_at')
+        if published_at is None:
+            published_at = now
+        story_id = find_story(conn, words, published_at) or row['link']
+        conn.execute('UPDATE articles SET story_id = ? WHERE link = ?', (story_id, row['link']))
+        index_article(conn, row['link'], words, published_at)
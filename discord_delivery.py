@@ -0,0 +1,163 @@
+import threading
+import time
+
+import requests
+
+import metrics
+
+# ------------------------------
+# Discord Limits
+# ------------------------------
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_MESSAGE_EMBED_CHARACTERS = 6000  # Sum over all embeds of one message
+MAX_TITLE_LENGTH = 256
+MAX_DESCRIPTION_LENGTH = 4096
+
+# ------------------------------
+# Delivery Settings
+# ------------------------------
+MAX_ATTEMPTS = 5  # Attempts per message, 429 responses included
+REQUEST_TIMEOUT_SECONDS = 10
+ERROR_BACKOFF_SECONDS = 1  # Doubled after each network or server error
+DEFAULT_RETRY_AFTER_SECONDS = 1  # Used when a 429 carries no retry_after
+
+# ------------------------------
+# Embed Packing
+# ------------------------------
+def truncate(text, limit):
+    """Shortens text to the given number of characters, marking the cut with an ellipsis."""
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+def embed_size(embed):
+    """Returns the characters of an embed that count toward Discord's per-message limit."""
+    size = len(embed.get('title', '')) + len(embed.get('description', ''))
+    size += len(embed.get('footer', {}).get('text', '')) + len(embed.get('author', {}).get('name', ''))
+    for field in embed.get('fields', []):
+        size += len(field.get('name', '')) + len(field.get('value', ''))
+    return size
+
+def pack_embeds(items):
+    """Groups (item, embed) pairs into messages of up to 10 embeds within the character limit.
+
+    Yields lists of pairs, in order, so callers know which items each message carries.
+    """
+    batch = []
+    batch_size = 0
+    for item, embed in items:
+        size = embed_size(embed)
+        if batch and (len(batch) == MAX_EMBEDS_PER_MESSAGE or batch_size + size > MAX_MESSAGE_EMBED_CHARACTERS):
+            yield batch
+            batch = []
+            batch_size = 0
+        batch.append((item, embed))
+        batch_size += size
+    if batch:
+        yield batch
+
+# ------------------------------
+# Rate Limiting
+# ------------------------------
+class RateLimiter:
+    """Token bucket for one webhook, refilled from Discord's X-RateLimit-* headers.
+
+    Until the first response arrives the bucket is assumed to allow one request.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.remaining = 1
+        self.reset_at = 0.0
+
+    def acquire(self):
+        """Blocks until a request may be sent and takes a token."""
+        with self.lock:
+            now = time.monotonic()
+            if self.remaining <= 0 and now < self.reset_at:
+                time.sleep(self.reset_at - now)
+            if time.monotonic() >= self.reset_at:
+                # The window is over; the next response tells the real bucket size
+                self.remaining = max(self.remaining, 1)
+            self.remaining -= 1
+
+    def update(self, headers):
+        """Refills the bucket from the rate-limit headers of a response."""
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset_after = headers.get('X-RateLimit-Reset-After')
+        if remaining is None or reset_after is None:
+            return
+        with self.lock:
+            self.remaining = int(remaining)
+            self.reset_at = time.monotonic() + float(reset_after)
+
+    def block(self, seconds):
+        """Empties the bucket for the given time (after a 429)."""
+        with self.lock:
+            self.remaining = 0
+            self.reset_at = time.monotonic() + seconds
+
+def retry_after_seconds(response):
+    """Reads how long Discord wants us to wait from a 429 response."""
+    try:
+        return float(response.json()['retry_after'])
+    except (ValueError, KeyError, TypeError):
+        pass
+    try:
+        return float(response.headers.get('Retry-After', DEFAULT_RETRY_AFTER_SECONDS))
+    except ValueError:
+        return DEFAULT_RETRY_AFTER_SECONDS
+
+# ------------------------------
+# Webhook Client
+# ------------------------------
+class WebhookClient:
+    """Sends messages to one webhook over a pooled connection, paced by its rate limits."""
+
+    def __init__(self, url, session=None):
+        self.url = url
+        self.session = session or requests.Session()
+        self.limiter = RateLimiter()
+
+    def send(self, embeds):
+        """Posts one message with the given embeds; returns True once Discord accepted it."""
+        backoff = ERROR_BACKOFF_SECONDS
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            if attempt > 1:
+                metrics.inc('discord_retries')
+            with metrics.timed('discord_rate_limit_wait'):
+                self.limiter.acquire()
+            try:
+                with metrics.timed('discord_request'):
+                    response = self.session.post(self.url, json={'embeds': embeds}, timeout=REQUEST_TIMEOUT_SECONDS)
+            except requests.exceptions.RequestException as req_err:
+                print(f"Error sending request: {req_err} - Attempt {attempt} of {MAX_ATTEMPTS}")
+                metrics.inc('discord_errors', kind='connection')
+                time.sleep(backoff)
+                backoff *= 2
+                continue
+
+            self.limiter.update(response.headers)
+            if response.status_code == 429:
+                retry_after = retry_after_seconds(response)
+                print(f"Rate limited, retrying in {retry_after:.2f}s - Attempt {attempt} of {MAX_ATTEMPTS}")
+                metrics.inc('discord_rate_limited')
+                self.limiter.block(retry_after)
+                continue
+            if response.status_code >= 500:
+                print(f"HTTP error occurred: {response.status_code} - Attempt {attempt} of {MAX_ATTEMPTS}")
+                metrics.inc('discord_errors', kind='server')
+                time.sleep(backoff)
+                backoff *= 2
+                continue
+            if response.status_code >= 400:
+                # Other client errors (bad payload, deleted webhook) won't succeed on a retry
+                print(f"HTTP error occurred: {response.status_code} {response.text[:200]}")
+                metrics.inc('discord_errors', kind='client')
+                return False
+            metrics.inc('discord_messages_sent')
+            metrics.inc('discord_embeds_sent', len(embeds))
+            return True
+        return False
+
+    def close(self):
+        """Closes the pooled connections."""
+        self.session.close()
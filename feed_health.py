@@ -0,0 +1,105 @@
+import json
+import time
+
+import storage
+
+# ------------------------------
+# Circuit Breaker Settings
+# ------------------------------
+FAILURE_THRESHOLD = 3  # Consecutive failures that open a feed's circuit
+BASE_BACKOFF_SECONDS = 300  # First skip period once the circuit is open, doubled after every failed probe
+MAX_BACKOFF_SECONDS = 6 * 3600
+LATENCY_HISTORY_SIZE = 20  # Recent fetch latencies kept per feed
+
+# ------------------------------
+# Feed Health
+# ------------------------------
+# A feed's circuit is closed while it has fewer than FAILURE_THRESHOLD consecutive failures
+# and it is polled normally. Once open, the feed is skipped until open_until; the next poll
+# after that is a half-open probe: a success closes the circuit, a failure opens it again for
+# twice as long.
+def new_health():
+    """Returns the health record of a feed that has not been polled yet."""
+    return {'consecutive_failures': 0, 'last_success': None, 'last_failure': None, 'last_error': None,
+            'open_until': 0.0, 'latencies': []}
+
+def load_health(conn):
+    """Returns a {source: health record} map of the stored feed health."""
+    cursor = conn.execute('''
+        SELECT source, consecutive_failures, last_success, last_failure, last_error, open_until, latencies
+        FROM feed_health
+    ''')
+    health = {}
+    for source, failures, last_success, last_failure, last_error, open_until, latencies in cursor.fetchall():
+        health[source] = {'consecutive_failures': failures, 'last_success': last_success,
+                          'last_failure': last_failure, 'last_error': last_error,
+                          'open_until': open_until, 'latencies': json.loads(latencies or '[]')}
+    return health
+
+def save_health(conn, health):
+    """Stores health records, to be committed with the articles of the same run."""
+    conn.executemany('''
+        INSERT OR REPLACE INTO feed_health
+            (source, consecutive_failures, last_success, last_failure, last_error, open_until, latencies)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(source, record['consecutive_failures'], record['last_success'], record['last_failure'],
+           record['last_error'], record['open_until'], json.dumps(record['latencies']))
+          for source, record in health.items()])
+
+def state(record, now):
+    """Returns 'closed', 'open' or 'half-open' for a health record."""
+    if record is None or record['consecutive_failures'] < FAILURE_THRESHOLD:
+        return 'closed'
+    return 'open' if now < record['open_until'] else 'half-open'
+
+def is_available(record, now):
+    """Tells whether a feed may be polled now (its circuit is closed or ready for a probe)."""
+    return state(record, now) != 'open'
+
+def add_latency(record, latency):
+    """Appends a poll latency, keeping the last LATENCY_HISTORY_SIZE."""
+    record['latencies'] = (record['latencies'] + [round(latency, 3)])[-LATENCY_HISTORY_SIZE:]
+
+def record_success(record, latency, now):
+    """Closes the circuit after a successful poll (a 304 counts as one)."""
+    add_latency(record, latency)
+    record['consecutive_failures'] = 0
+    record['last_success'] = now
+    record['open_until'] = 0.0
+
+def record_failure(record, latency, error, now):
+    """Counts a failed poll, opening the circuit (for longer after each failed probe) once over the threshold."""
+    add_latency(record, latency)
+    record['consecutive_failures'] += 1
+    record['last_failure'] = now
+    record['last_error'] = str(error)[:500]
+    excess = record['consecutive_failures'] - FAILURE_THRESHOLD
+    if excess >= 0:
+        record['open_until'] = now + min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** min(excess, 16))
+
+def median_latency(record):
+    """Returns the median of a feed's recent fetch latencies, or None."""
+    latencies = sorted(record['latencies'])
+    return latencies[len(latencies) // 2] if latencies else None
+
+def main():
+    storage.setup_database()
+    conn = storage.connect()
+    try:
+        health = load_health(conn)
+    finally:
+        conn.close()
+    if not health:
+        print("No feed has been polled yet.")
+        return
+    now = time.time()
+    for source, record in sorted(health.items()):
+        latency = median_latency(record)
+        last_success = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(record['last_success'])) \
+            if record['last_success'] else 'never'
+        print(f"{source:<18} {state(record, now):<9} failures={record['consecutive_failures']:<3} "
+              f"median={f'{latency:.2f}s' if latency is not None else '-':<7} last success={last_success}"
+              + (f"  last error: {record['last_error']}" if record['consecutive_failures'] else ''))
+
+if __name__ == '__main__':
+    main()
@@ -1,84 +1,109 @@
-import requests
-import json
-import time
-import os
 import random
+from concurrent.futures import ThreadPoolExecutor
 
-# Environment variable for Discord webhook
-DISCORD_WEBHOOK_URL = os.getenv('DISCORD_WEBHOOK_URL')
-JSON_INPUT_PATH = 'unsent_to_discord.json'
-MESSAGE_BATCH_SIZE = 10
-BATCH_DELAY_SECONDS = 5
+import discord_delivery
+import metrics
+import outbox
+import routing
+import storage
 
-RETRY_DELAY_SECONDS = 5
-MAX_RETRIES = 3  # Maximum number of retries for a failed message
+OUTBOX_BATCH_SIZE = 50  # Articles claimed from the outbox at a time
 
 def create_news_embed(article):
     """Creates a Discord embed for a news item with a random color."""
+    description = f"{article['description']}\n\nPublished on: {article['publication_date'] or 'Unknown'}\n[Read more...]({article['link']})"
     embed = {
-        "title": article['title'],
-        "description": f"{article['description']}\n\nPublished on: {article['publication_date']}\n[Read more...]({article['link']})",
+        "title": discord_delivery.truncate(article['title'] or '', discord_delivery.MAX_TITLE_LENGTH),
+        "description": discord_delivery.truncate(description, discord_delivery.MAX_DESCRIPTION_LENGTH),
         "color": random.randint(0, 0xFFFFFF)  # Random color
     }
     if article.get('content_url') and article['content_url'] != "No Image":
         embed["image"] = {"url": article['content_url']}
     return embed
 
-def send_discord_message(embeds):
-    """Sends a message to the Discord channel via webhook with error handling and retry mechanism."""
-    data = {"embeds": embeds}
-    attempts = 0
+def send_messages_from_outbox(conn, client, target=routing.DEFAULT_TARGET):
+    """Drains a target's outbox queue in batches, packing up to 10 embeds per message; returns the number of articles sent."""
+    claimed_by = outbox.worker_id()
+    sent_count = 0
+    while True:
+        articles = outbox.claim_batch(conn, claimed_by, OUTBOX_BATCH_SIZE, target)
+        if not articles:
+            return sent_count
 
-    while attempts < MAX_RETRIES:
-        try:
-            response = requests.post(DISCORD_WEBHOOK_URL, json=data)
-            response.raise_for_status()
-            return True
-        except requests.exceptions.HTTPError as http_err:
-            print(f"HTTP error occurred: {http_err} - Attempt {attempts + 1} of {MAX_RETRIES}")
-        except requests.exceptions.ConnectionError as conn_err:
-            print(f"Connection error occurred: {conn_err} - Attempt {attempts + 1} of {MAX_RETRIES}")
-        except requests.exceptions.Timeout as timeout_err:
-            print(f"Timeout error occurred: {timeout_err} - Attempt {attempts + 1} of {MAX_RETRIES}")
-        except requests.exceptions.RequestException as req_err:
-            print(f"Error sending request: {req_err} - Attempt {attempts + 1} of {MAX_RETRIES}")
+        pairs = [(article, create_news_embed(article)) for article in articles]
+        for batch in discord_delivery.pack_embeds(pairs):
+            held = outbox.renew(conn, [article['outbox_id'] for article, _ in batch], claimed_by)
+            if len(held) < len(batch):
+                metrics.inc('outbox_lease_lost', len(batch) - len(held))
+                batch = [(article, embed) for article, embed in batch if article['outbox_id'] in held]
+                if not batch:
+                    continue
+            outbox_ids = [article['outbox_id'] for article, _ in batch]
+            if client.send([embed for _, embed in batch]):
+                outbox.ack(conn, outbox_ids, claimed_by)
+                sent_count += len(batch)
+                for article, _ in batch:
+                    print(f"Sent article to {target}: {article['title']}")
+            else:
+                outbox.retry(conn, outbox_ids, claimed_by, 'webhook delivery failed')
+                metrics.inc('outbox_retried', len(batch))
+                for article, _ in batch:
+                    print(f"Failed to send article to {target}: {article['title']}")
 
-        attempts += 1
-        if attempts < MAX_RETRIES:
-            time.sleep(RETRY_DELAY_SECONDS)
+def deliver_route(route, client):
+    """Drains one route's queue over its own database connection; returns the number of articles sent."""
+    conn = storage.connect()
+    try:
+        return send_messages_from_outbox(conn, client, route.name)
+    finally:
+        conn.close()
 
-    return False
+def deliver(routes, clients):
+    """Delivers every route's queue at the same time; returns {route name: articles sent}.
 
-def send_messages_from_json():
-    """Sends messages to Discord from JSON file."""
-    try:
-        with open(JSON_INPUT_PATH, 'r') as file:
-            articles = json.load(file)
-    except FileNotFoundError:
-        print(f"File not found: {JSON_INPUT_PATH}")
-        return
+    Each route has its own WebhookClient, and with it its own rate limiter, so a channel that
+    is being rate limited never holds up the others. clients maps route names to clients.
+    """
+    routes = [route for route in routes if route.name in clients]
+    if not routes:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(routes)) as executor:
+        futures = {route.name: executor.submit(deliver_route, route, clients[route.name]) for route in routes}
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            print(f"Delivery to {name} failed: {e}")
+            results[name] = 0
+    return results
 
-    for index, article in enumerate(articles, start=1):
-        embed = create_news_embed(article)
-        if send_discord_message([embed]):
-            print(f"Sent article: {article['title']}")
+def open_clients(routes):
+    """Creates a WebhookClient for every route that has a webhook URL."""
+    clients = {}
+    for route in routes:
+        if route.url:
+            clients[route.name] = discord_delivery.WebhookClient(route.url)
         else:
-            print(f"Failed to send article: {article['title']}")
-
-        if index % MESSAGE_BATCH_SIZE == 0:
-            time.sleep(BATCH_DELAY_SECONDS)
-def clear_json_file():
-    """Clears the contents of the JSON file."""
-    with open(JSON_INPUT_PATH, 'w') as file:
-        json.dump([], file)  # Write an empty list to the file
+            print(f"No webhook URL for route {route.name}, its articles stay queued.")
+    return clients
 
 def main():
-    if not DISCORD_WEBHOOK_URL:
-        print("Discord webhook URL is not set. Please set the DISCORD_WEBHOOK_URL environment variable.")
+    routes = routing.load_routes()
+    clients = open_clients(routes)
+    if not clients:
+        print("Discord webhook URL is not set. Please set the DISCORD_WEBHOOK_URL environment variable "
+              f"or list webhooks in {routing.ROUTES_PATH}.")
         return
 
-    send_messages_from_json()
-    clear_json_file()
+    storage.setup_database()
+    try:
+        with metrics.stage('notify'):
+            deliver(routes, clients)
+    finally:
+        for client in clients.values():
+            client.close()
+        metrics.write_metrics_file('notify')
 
 if __name__ == '__main__':
     main()
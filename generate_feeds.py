@@ -0,0 +1,172 @@
+import gzip
+import os
+import re
+from collections import OrderedDict
+from email.utils import formatdate
+from xml.sax.saxutils import escape, quoteattr
+
+import dates
+import metrics
+import storage
+from generate_html_page import plain_text, section_slug
+
+# ------------------------------
+# Feed Settings
+# ------------------------------
+FEEDS_DIR = os.getenv('FEEDS_DIR', 'feeds')  # all.rss, all.atom and <source>.rss / .atom, each with a .gz copy
+FEED_BASE_URL = os.getenv('FEED_BASE_URL', '')  # Public URL of FEEDS_DIR, e.g. https://example.com/feeds/
+FEED_ITEM_LIMIT = 50  # Newest articles per feed
+FEED_TITLE = 'Crypto News'
+BUILD_STATE_NAME = 'feed_build'
+ITEM_CACHE_SIZE = 2000  # Serialized items kept between builds
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# ------------------------------
+# Serialization
+# ------------------------------
+# Items are serialized once and kept in an LRU cache, so a build in a long-running process
+# only serializes the articles that are new since the previous one; feeds are then joined
+# from cached strings.
+_item_cache = OrderedDict()
+
+def xml_text(text):
+    """Escapes text for an XML element, dropping characters XML does not allow."""
+    return escape(INVALID_XML_CHARS.sub('', text or ''))
+
+def rss_date(published_at):
+    """Formats epoch seconds as an RFC 822 date in GMT, as RSS expects."""
+    return formatdate(published_at, usegmt=True)
+
+def atom_date(published_at):
+    """Formats epoch seconds as an RFC 3339 UTC date, as Atom expects."""
+    return dates.format_timestamp(published_at).replace(' ', 'T') + 'Z'
+
+def render_rss_item(article_id, title, link, description, published_at, source):
+    """Serializes an article as an RSS <item>."""
+    return (f'<item><title>{xml_text(title)}</title><link>{xml_text(link)}</link>'
+            f'<guid isPermaLink="true">{xml_text(link)}</guid>'
+            f'<description>{xml_text(plain_text(description))}</description>'
+            f'<pubDate>{rss_date(published_at)}</pubDate><category>{xml_text(source)}</category>'
+            '</item>\n')
+
+def render_atom_entry(article_id, title, link, description, published_at, source):
+    """Serializes an article as an Atom <entry>."""
+    return (f'<entry><title>{xml_text(title)}</title><link href={quoteattr(link or "")}/>'
+            f'<id>{xml_text(link)}</id><updated>{atom_date(published_at)}</updated>'
+            f'<author><name>{xml_text(source)}</name></author>'
+            f'<summary>{xml_text(plain_text(description))}</summary>'
+            '</entry>\n')
+
+RENDERERS = {'rss': render_rss_item, 'atom': render_atom_entry}
+
+def render_item(feed_format, row):
+    """Returns an article's serialized item, from the cache when it was rendered before."""
+    key = (feed_format, row[0])
+    item = _item_cache.get(key)
+    if item is None:
+        metrics.inc('feed_item_cache_misses')
+        item = RENDERERS[feed_format](*row)
+        _item_cache[key] = item
+        while len(_item_cache) > ITEM_CACHE_SIZE:
+            _item_cache.popitem(last=False)
+    else:
+        _item_cache.move_to_end(key)
+    return item
+
+def render_rss(title, slug, rows):
+    """Returns the RSS 2.0 document of a feed listing the given article rows."""
+    self_link = f'<atom:link href={quoteattr(FEED_BASE_URL + slug + ".rss")} rel="self" type="application/rss+xml"/>' \
+        if FEED_BASE_URL else ''
+    parts = ['<?xml version="1.0" encoding="utf-8"?>\n'
+             '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom"><channel>'
+             f'<title>{xml_text(title)}</title><link>{xml_text(FEED_BASE_URL)}</link>'
+             f'<description>{xml_text(title)}</description>{self_link}'
+             + (f'<lastBuildDate>{rss_date(rows[0][4])}</lastBuildDate>' if rows else '') + '\n']
+    parts.extend(render_item('rss', row) for row in rows)
+    parts.append('</channel></rss>\n')
+    return ''.join(parts)
+
+def render_atom(title, slug, rows):
+    """Returns the Atom document of a feed listing the given article rows."""
+    self_link = f'<link href={quoteattr(FEED_BASE_URL + slug + ".atom")} rel="self"/>' if FEED_BASE_URL else ''
+    parts = ['<?xml version="1.0" encoding="utf-8"?>\n'
+             '<feed xmlns="http://www.w3.org/2005/Atom">'
+             f'<title>{xml_text(title)}</title><id>urn:cryptonews:feed:{slug}</id>{self_link}'
+             f'<updated>{atom_date(rows[0][4]) if rows else atom_date(0)}</updated>\n']
+    parts.extend(render_item('atom', row) for row in rows)
+    parts.append('</feed>\n')
+    return ''.join(parts)
+
+# ------------------------------
+# Feed Files
+# ------------------------------
+def feed_path(slug, feed_format):
+    """Returns the file path of a feed ('rss' or 'atom')."""
+    return os.path.join(FEEDS_DIR, f'{slug}.{feed_format}')
+
+def write_feed(path, xml):
+    """Writes a feed and its gzip copy, each swapped in whole so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    data = xml.encode('utf-8')
+    # mtime=0 keeps the .gz identical for identical feeds
+    for target, content in ((path, data), (f'{path}.gz', gzip.compress(data, 9, mtime=0))):
+        temp_path = f'{target}.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(content)
+        os.replace(temp_path, target)
+    metrics.inc('feed_files_written')
+
+def fetch_feed_rows(conn, source):
+    """Fetches a feed's newest dated articles; the global feed has one article per story."""
+    where, params = ('source = ?', [source]) if source is not None else ('(story_id IS NULL OR story_id = link)', [])
+    cursor = conn.execute(f'''
+        SELECT id, title, link, description, published_at, source FROM articles
+        WHERE {where} AND published_at IS NOT NULL
+        ORDER BY published_at DESC, id DESC LIMIT ?
+    ''', params + [FEED_ITEM_LIMIT])
+    return cursor.fetchall()
+
+def build_feeds(conn):
+    """Rewrites the feeds whose articles changed since the last build; returns how many were written.
+
+    A feed's version is the newest id and the count of its articles. They are read by one scan
+    of the (source, id) index, which grows with the hot database, and an idle build writes nothing.
+    """
+    state = storage.get_state(conn, BUILD_STATE_NAME, {})
+    versions = {section_slug(source): [source, last_id, count] for source, last_id, count in conn.execute(
+        'SELECT source, MAX(id), COUNT(*) FROM articles GROUP BY source')}
+    versions['all'] = [None, max((version[1] for version in versions.values()), default=0),
+                       sum(version[2] for version in versions.values())]
+
+    written = 0
+    for slug, (source, last_id, count) in versions.items():
+        if state.get(slug) == [last_id, count] and os.path.exists(feed_path(slug, 'atom') + '.gz'):
+            continue
+        rows = fetch_feed_rows(conn, source)
+        title = FEED_TITLE if source is None else f'{FEED_TITLE}: {source}'
+        write_feed(feed_path(slug, 'rss'), render_rss(title, slug, rows))
+        write_feed(feed_path(slug, 'atom'), render_atom(title, slug, rows))
+        state[slug] = [last_id, count]
+        written += 1
+
+    if written:
+        with conn:
+            storage.set_state(conn, BUILD_STATE_NAME, state)
+    return written
+
+def main():
+    storage.setup_database()
+    conn = storage.connect()
+    try:
+        with metrics.stage('feeds'):
+            written = build_feeds(conn)
+        if written:
+            print(f"{written} feeds written to {FEEDS_DIR}/")
+        else:
+            print("No new articles, feeds are up to date.")
+    finally:
+        conn.close()
+        metrics.write_metrics_file('feeds')
+
+if __name__ == '__main__':
+    main()
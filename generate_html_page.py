@@ -1,86 +1,297 @@
-import sqlite3
+import html
+import itertools
 import os
+import re
+from string import Template
+
+import image_cache
+import metrics
+import retention
+import storage
 
-DATABASE_PATH = 'central_rss_articles.db'
 HTML_OUTPUT_PATH = 'crypto_news.html'
+ARCHIVE_DIR = 'archive'
+LATEST_LIMIT = 100  # Stories on the front page
+PAGE_SIZE = 100  # Articles per archive page
+BUILD_STATE_NAME = 'html_build'
+SECTION_COLUMNS = 'id, title, link, description, publication_date, content_url, published_at'
+
+# ------------------------------
+# Templates
+# ------------------------------
+# Compiled once; pages are assembled from a list of rendered parts and streamed to disk
+PAGE_TEMPLATE = Template('''<html>
+<head>
+    <title>$title</title>
+    <meta charset="UTF-8">
+    <style>
+        body {
+            font-family: Arial, sans-serif;
+            background-color: #121212;
+            color: #e0e0e0;
+        }
+        .article-block {
+            margin-bottom: 20px;
+            padding: 10px;
+            border: 1px solid #333;
+            border-radius: 5px;
+            background-color: #1e1e1e;
+        }
+        .article-image {
+            max-width: 150px;
+            height: auto;
+            display: block;
+            margin-bottom: 10px;
+        }
+        .article-title {
+            font-size: 20px;
+            font-weight: bold;
+            margin: 0;
+        }
+        .article-description { margin-top: 5px; }
+        .article-title a, .nav a {
+            text-decoration: none;
+            color: #4f9d69;
+        }
+        .article-title a:hover, .nav a:hover {
+            text-decoration: underline;
+        }
+        .nav { margin: 15px 0; }
+    </style>
+</head>
+<body>
+    <h1>$heading</h1>
+    <div class="nav">$nav</div>
+''')
+
+PAGE_END_TEMPLATE = Template('''    <div class="nav">$nav</div>
+</body>
+</html>
+''')
+
+ARTICLE_TEMPLATE = Template('''    <div class="article-block">
+        <div class="article-title"><a href="$link">$title</a></div>
+        $image
+        <div class="article-description">$description</div>
+        <div>Published on: $pub_date</div>
+    </div>
+''')
+
+IMAGE_TEMPLATE = Template('<img src="$src" class="article-image" alt="$alt">')
+
+# ------------------------------
+# Rendering
+# ------------------------------
+def plain_text(raw_html):
+    """Removes HTML tags and entities so descriptions can be escaped safely."""
+    return html.unescape(re.sub('<.*?>', '', raw_html or ''))
+
+def render_article(title, link, description, pub_date, content_url, images=None):
+    """Renders one article block with all values escaped.
 
-def fetch_data():
-    """Fetches data from the articles table."""
-    conn = sqlite3.connect(DATABASE_PATH)
+    images maps image URLs to cached local copies; images that are not cached are hot-linked.
+    """
+    title = html.escape(title or '')
+    image = ''
+    if images and content_url in images:
+        image = IMAGE_TEMPLATE.substitute(src=html.escape(images[content_url]), alt=title)
+    elif content_url and content_url.startswith(('http://', 'https://')):
+        image = IMAGE_TEMPLATE.substitute(src=html.escape(content_url), alt=title)
+    return ARTICLE_TEMPLATE.substitute(
+        link=html.escape(link or ''),
+        title=title,
+        image=image,
+        description=html.escape(plain_text(description)),
+        pub_date=html.escape(pub_date or 'Unknown'),
+    )
+
+def render_page(title, rows, nav='', images=None):
+    """Yields the parts of a page listing the given article rows."""
+    yield PAGE_TEMPLATE.substitute(title=html.escape(title), heading=html.escape(title), nav=nav)
+    for row in rows:
+        yield render_article(*row, images=images)
+    yield PAGE_END_TEMPLATE.substitute(nav=nav)
+
+def write_page(path, parts):
+    """Streams page parts to a temporary file and swaps it in, so readers never see a partial page."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        file.writelines(parts)
+    os.replace(temp_path, path)
+    metrics.inc('html_pages_written')
+
+# ------------------------------
+# Front Page
+# ------------------------------
+def fetch_data(conn):
+    """Fetches the latest stories from the articles table."""
     cursor = conn.cursor()
-    # Fetch the last 100 data sorted by publication_date in descending order from articles table
-    cursor.execute('SELECT title, link, description, publication_date, content_url FROM articles ORDER BY publication_date DESC LIMIT 100')
-    data = cursor.fetchall()
-    conn.close()
-    return data
-
-def generate_html(data):
-    """Generates an HTML page from the data."""
-    html_content = '''
-    <html>
-    <head>
-        <title>Crypto News</title>
-        <meta charset="UTF-8">  # Specify UTF-8 encoding
-        <style>
-            body { 
-                font-family: Arial, sans-serif; 
-                background-color: #121212; 
-                color: #e0e0e0; 
-            }
-            .article-block { 
-                margin-bottom: 20px; 
-                padding: 10px; 
-                border: 1px solid #333; 
-                border-radius: 5px; 
-                background-color: #1e1e1e;
-            }
-            .article-image { 
-                max-width: 150px; 
-                height: auto; 
-                display: block; 
-                margin-bottom: 10px; 
-            }
-            .article-title { 
-                font-size: 20px; 
-                font-weight: bold; 
-                margin: 0; 
-            }
-            .article-description { margin-top: 5px; }
-            .article-title a { 
-                text-decoration: none; 
-                color: #4f9d69; 
-            }
-            .article-title a:hover { 
-                text-decoration: underline; 
-            }
-        </style>
-    </head>
-    <body>
-        <h1>Crypto News</h1>
-    '''
-
-    for title, link, description, pub_date, content_url in data:
-        html_content += f'''
-            <div class="article-block">
-                <div class="article-title"><a href="{link}">{title}</a></div>
-                <img src="{content_url}" class="article-image" alt="{title}">
-                <div class="article-description">{description}</div>
-                <div>Published on: {pub_date}</div>
-            </div>
-        '''
-
-    html_content += '''
-    </body>
-    </html>
-    '''
-
-    with open(HTML_OUTPUT_PATH, 'w', encoding='utf-8') as file:  # Specify encoding as utf-8
-        file.write(html_content)
+    # Fetch the last stories sorted by publication time in descending order, one article per story
+    cursor.execute('''
+        SELECT title, link, description, publication_date, content_url FROM articles
+        WHERE story_id IS NULL OR story_id = link
+        ORDER BY published_at DESC LIMIT ?
+    ''', (LATEST_LIMIT,))
+    return cursor.fetchall()
+
+def generate_html(data, images=None):
+    """Generates the front page from the data."""
+    nav = f'<a href="{ARCHIVE_DIR}/index.html">Archive</a>'
+    write_page(HTML_OUTPUT_PATH, render_page('Crypto News', data, nav, images))
+
+# ------------------------------
+# Archive
+# ------------------------------
+# Archive pages are numbered from the oldest article (page 1) so that new articles only
+# ever land on the last pages; earlier pages are written once and then left alone. Articles
+# moved to the monthly archive databases by retention.py stay on their pages: sections count
+# them, and pages are read from the hot database and the archives together.
+def section_slug(source):
+    """Returns the directory name of an archive section (None is the all-sources section)."""
+    if source is None:
+        return 'all'
+    return re.sub(r'[^a-z0-9]+', '-', source.lower()).strip('-') or 'source'
+
+def page_path(source, page):
+    """Returns the file path of an archive page (pages start at 1)."""
+    return os.path.join(ARCHIVE_DIR, section_slug(source), f'page-{page}.html')
+
+def section_filter(source):
+    """Returns the WHERE clause and parameters selecting a section's articles."""
+    if source is None:
+        return '1 = 1', []
+    return 'source = ?', [source]
+
+def count_section(conn, source, max_id=None):
+    """Counts a section's articles, optionally only those with id <= max_id."""
+    where, params = section_filter(source)
+    if max_id is not None:
+        where += ' AND id <= ?'
+        params = params + [max_id]
+    return conn.execute(f'SELECT COUNT(*) FROM articles WHERE {where}', params).fetchone()[0]
+
+def page_nav(page, page_count):
+    """Builds the navigation links of an archive page."""
+    links = ['<a href="../../crypto_news.html">Latest</a>', '<a href="../index.html">Archive</a>']
+    if page < page_count:
+        links.append(f'<a href="page-{page + 1}.html">Newer</a>')
+    if page > 1:
+        links.append(f'<a href="page-{page - 1}.html">Older</a>')
+    return ' | '.join(links)
+
+def build_section(conn, source, previous, previous_last_id, archived):
+    """Rewrites the archive pages of a section that changed since the last build.
+
+    previous is the section's [article count, first id of its last page] from the last build,
+    archived the number of its articles in the archive databases. Returns the new pair.
+    """
+    count = count_section(conn, source) + archived
+    page_count = max(1, -(-count // PAGE_SIZE))
+
+    first_page = 1
+    start_id = 0
+    if (isinstance(previous, list)
+            and count_section(conn, source, previous_last_id) + archived == previous[0]
+            and os.path.exists(page_path(source, 1))):
+        if count == previous[0]:
+            return previous
+        # Nothing before the previous last page changed; it is rewritten for its new "Newer" link
+        first_page = max(1, -(-previous[0] // PAGE_SIZE))
+        start_id = previous[1]
+    if first_page > page_count:
+        return [count, start_id]
+
+    label = source or 'All sources'
+    rows = retention.iter_section(conn, source, SECTION_COLUMNS, start_id)
+    try:
+        for page in range(first_page, page_count + 1):
+            page_rows = list(itertools.islice(rows, PAGE_SIZE))
+            if page_rows:
+                start_id = page_rows[0][0]
+            # Newest first on the page, articles without a date last
+            page_rows.sort(key=lambda row: (row[6] is not None, row[6] or 0), reverse=True)
+            title = f'Crypto News Archive - {label} - Page {page}'
+            write_page(page_path(source, page),
+                       render_page(title, [row[1:6] for row in page_rows], page_nav(page, page_count)))
+    finally:
+        rows.close()
+
+    # Pages left over after articles were removed
+    page = page_count + 1
+    while os.path.exists(page_path(source, page)):
+        os.remove(page_path(source, page))
+        page += 1
+    return [count, start_id]
+
+def generate_archive_index(section_counts):
+    """Writes the archive index linking to the newest page of every section."""
+    items = []
+    for source, count in section_counts:
+        page_count = max(1, -(-count // PAGE_SIZE))
+        items.append(
+            f'    <div class="article-block"><div class="article-title">'
+            f'<a href="{section_slug(source)}/page-{page_count}.html">{html.escape(source or "All sources")}</a>'
+            f'</div><div>{count} articles, {page_count} pages</div></div>\n'
+        )
+    nav = '<a href="../crypto_news.html">Latest</a>'
+    parts = [PAGE_TEMPLATE.substitute(title='Crypto News Archive', heading='Crypto News Archive', nav=nav)]
+    parts.extend(items)
+    parts.append(PAGE_END_TEMPLATE.substitute(nav=nav))
+    write_page(os.path.join(ARCHIVE_DIR, 'index.html'), parts)
+
+def build_site(conn, image_fetcher=None):
+    """Rebuilds the front page and the affected archive pages; returns False if nothing changed.
+
+    The front page serves its images from the local thumbnail cache. It is rebuilt on every
+    change, which keeps its images the most recently used ones, so eviction only ever removes
+    images no page links to anymore. Archive pages are written once and keep the original URLs.
+    """
+    state = storage.get_state(conn, BUILD_STATE_NAME, {})
+    archived = retention.archived_counts(conn)
+    last_id, total = conn.execute('SELECT COALESCE(MAX(id), 0), COUNT(*) FROM articles').fetchone()
+    # Articles moved to the archives still count, so running retention alone changes nothing here
+    total += sum(archived.values())
+    if (state.get('last_id') == last_id and state.get('total') == total
+            and os.path.exists(HTML_OUTPUT_PATH)):
+        return False
+
+    data = fetch_data(conn)
+    images = image_cache.cache_images(conn, [row[4] for row in data], image_fetcher) \
+        if image_cache.IMAGE_CACHE_ENABLED else {}
+    generate_html(data, images)
+
+    previous_sections = state.get('sections', {})
+    stored = {source for source, in conn.execute('SELECT DISTINCT source FROM articles')}
+    sources = [None] + sorted(stored | {source for source in archived if source})
+    section_counts = []
+    sections = {}
+    for source in sources:
+        key = section_slug(source)
+        section_archived = sum(archived.values()) if source is None else archived.get(source, 0)
+        sections[key] = build_section(conn, source, previous_sections.get(key), state.get('last_id', 0),
+                                      section_archived)
+        section_counts.append((source, sections[key][0]))
+    generate_archive_index(section_counts)
+
+    with conn:
+        storage.set_state(conn, BUILD_STATE_NAME, {'last_id': last_id, 'total': total, 'sections': sections})
+    return True
 
 
 def main():
-    data = fetch_data()
-    generate_html(data)
+    storage.setup_database()
+    conn = storage.connect()
+    try:
+        with metrics.stage('render'):
+            built = build_site(conn)
+        if built:
+            print(f"HTML written to {HTML_OUTPUT_PATH} and {ARCHIVE_DIR}/")
+        else:
+            print("No new articles, HTML is up to date.")
+    finally:
+        conn.close()
+        metrics.write_metrics_file('render')
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,214 @@
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import metrics
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, without it images are cached at their original size
+    Image = None
+
+# ------------------------------
+# Image Cache Settings
+# ------------------------------
+IMAGE_CACHE_ENABLED = os.getenv('IMAGE_CACHE', '1') == '1'
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', 'images')  # Relative to the site root (next to crypto_news.html)
+IMAGE_CACHE_MAX_BYTES = int(os.getenv('IMAGE_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+THUMBNAIL_WIDTH = 480
+THUMBNAIL_QUALITY = 80
+MAX_IMAGE_BYTES = 10 * 1024 * 1024  # Larger downloads are abandoned
+FETCH_TIMEOUT_SECONDS = 10
+FETCH_CONCURRENCY = 8
+RETRY_FAILED_SECONDS = 24 * 3600  # A URL that could not be fetched is tried again after this long
+URL_LOOKUP_BATCH_SIZE = 500
+USER_AGENT = 'CryptoNews-Agregator/1.0 (+https://github.com/p3tr1nn1/CryptoNews-Agregator)'
+
+# Magic numbers of the formats browsers display; anything else is not cached
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+]
+
+# ------------------------------
+# Fetching
+# ------------------------------
+# A fetcher is any callable taking a URL and returning the image bytes (raising on failure),
+# so the cache can be driven by a local server or a stub instead of the network.
+class HttpFetcher:
+    """Downloads images over a pooled connection, refusing bodies over MAX_IMAGE_BYTES."""
+
+    def __init__(self, session=None):
+        self.session = session or requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+
+    def __call__(self, url):
+        with self.session.get(url, timeout=FETCH_TIMEOUT_SECONDS, stream=True) as response:
+            response.raise_for_status()
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data.extend(chunk)
+                if len(data) > MAX_IMAGE_BYTES:
+                    raise ValueError(f'image larger than {MAX_IMAGE_BYTES} bytes')
+            return bytes(data)
+
+    def close(self):
+        """Closes the pooled connections."""
+        self.session.close()
+
+def fetch_quietly(fetcher, url):
+    """Runs the fetcher; returns None instead of raising."""
+    try:
+        with metrics.timed('image_fetch'):
+            return fetcher(url)
+    except Exception as e:
+        print(f"Failed to fetch image {url}: {e}")
+        metrics.inc('image_fetch_errors')
+        return None
+
+# ------------------------------
+# Thumbnails
+# ------------------------------
+def image_extension(data):
+    """Returns the file extension of image bytes, or None if they are not a supported image."""
+    for signature, extension in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+def make_thumbnail(data, extension):
+    """Scales an image down to THUMBNAIL_WIDTH; returns (bytes, extension).
+
+    Without Pillow, or for images that are already small or can't be decoded, the original is kept.
+    """
+    if Image is None:
+        return data, extension
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.width <= THUMBNAIL_WIDTH:
+                return data, extension
+            image.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 4))
+            output = io.BytesIO()
+            image.convert('RGB').save(output, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+            return output.getvalue(), 'jpg'
+    except Exception:
+        return data, extension
+
+def write_file(path, data):
+    """Writes a file atomically."""
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(data)
+    os.replace(temp_path, path)
+
+def store_image(conn, data, now):
+    """Stores the thumbnail of downloaded image bytes; returns their content digest, or None.
+
+    Images are keyed by the SHA-256 of the downloaded bytes, so the same picture behind
+    several URLs is resized and stored once.
+    """
+    extension = image_extension(data)
+    if extension is None:
+        metrics.inc('image_fetch_errors')
+        return None
+    digest = hashlib.sha256(data).hexdigest()
+    if conn.execute('SELECT 1 FROM image_files WHERE digest = ?', (digest,)).fetchone():
+        metrics.inc('image_dedupe_hits')
+        return digest
+
+    thumbnail, extension = make_thumbnail(data, extension)
+    path = f'{IMAGE_CACHE_DIR}/{digest[:32]}.{extension}'
+    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+    write_file(path, thumbnail)
+    conn.execute('INSERT INTO image_files (digest, path, size, last_used) VALUES (?, ?, ?, ?)',
+                 (digest, path, len(thumbnail), now))
+    metrics.inc('image_bytes_stored', len(thumbnail))
+    return digest
+
+# ------------------------------
+# Cache
+# ------------------------------
+def lookup(conn, urls):
+    """Returns {url: (digest, fetched_at, path)} for the URLs the cache has seen."""
+    known = {}
+    for start in range(0, len(urls), URL_LOOKUP_BATCH_SIZE):
+        batch = urls[start:start + URL_LOOKUP_BATCH_SIZE]
+        cursor = conn.execute(f'''
+            SELECT u.url, u.digest, u.fetched_at, f.path
+            FROM image_urls u LEFT JOIN image_files f ON f.digest = u.digest
+            WHERE u.url IN ({','.join('?' * len(batch))})
+        ''', batch)
+        known.update((url, (digest, fetched_at, path)) for url, digest, fetched_at, path in cursor.fetchall())
+    return known
+
+def needs_fetch(entry, now):
+    """Tells whether a URL has to be downloaded (new, evicted, or failed long enough ago)."""
+    if entry is None:
+        return True
+    digest, fetched_at, path = entry
+    if digest is None:
+        return fetched_at < now - RETRY_FAILED_SECONDS
+    return path is None
+
+def evict(conn):
+    """Deletes the least recently used thumbnails until the cache fits IMAGE_CACHE_MAX_BYTES."""
+    total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM image_files').fetchone()[0]
+    while total > IMAGE_CACHE_MAX_BYTES:
+        victims = conn.execute('SELECT digest, path, size FROM image_files ORDER BY last_used LIMIT 100').fetchall()
+        if not victims:
+            return
+        for digest, path, size in victims:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            conn.execute('DELETE FROM image_files WHERE digest = ?', (digest,))
+            total -= size
+            metrics.inc('image_evictions')
+            if total <= IMAGE_CACHE_MAX_BYTES:
+                return
+
+def cache_images(conn, urls, fetcher=None):
+    """Makes sure the given image URLs are cached; returns {url: local path} for those that are.
+
+    Missing images are fetched concurrently, every returned image is marked as just used,
+    and the least recently used ones are evicted once the cache is over its size limit.
+    """
+    urls = list({url for url in urls if url and url.startswith(('http://', 'https://'))})
+    if not urls:
+        return {}
+    now = time.time()
+    known = lookup(conn, urls)
+    missing = [url for url in urls if needs_fetch(known.get(url), now)]
+
+    downloads = []
+    if missing:
+        own_fetcher = fetcher is None
+        fetcher = fetcher or HttpFetcher()
+        try:
+            with ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY) as executor:
+                downloads = list(zip(missing, executor.map(lambda url: fetch_quietly(fetcher, url), missing)))
+        finally:
+            if own_fetcher:
+                fetcher.close()
+
+    with conn:
+        for url, data in downloads:
+            digest = store_image(conn, data, now) if data else None
+            conn.execute('INSERT OR REPLACE INTO image_urls (url, digest, fetched_at) VALUES (?, ?, ?)',
+                         (url, digest, now))
+        paths = {url: path for url, (digest, fetched_at, path) in lookup(conn, urls).items() if path}
+        conn.executemany('''
+            UPDATE image_files SET last_used = ? WHERE digest = (SELECT digest FROM image_urls WHERE url = ?)
+        ''', [(now, url) for url in paths])
+        evict(conn)
+    # Images evicted right away (a cache smaller than one page) are left out
+    return {url: path for url, path in paths.items() if os.path.exists(path)}
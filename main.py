@@ -1,9 +1,18 @@
 import feedparser
-import sqlite3
+import requests
 import html
+import os
 import re
-from datetime import datetime
-from email.utils import parsedate_tz, mktime_tz
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import dates
+import dedupe
+import feed_health
+import metrics
+import storage
+import streaming_feed
+import tagging
 
 # ------------------------------
 # RSS Feed URLs
@@ -22,49 +31,66 @@ NEWSBTC_RSS_URL = 'https://www.newsbtc.com/feed'  # NewsBTC RSS URL
 BITCOIN_NEWS_RSS_URL = 'https://news.bitcoin.com/feed'  # Bitcoin News RSS URL
 
 # ------------------------------
-# Database Setup
+# Fetch Settings
+# ------------------------------
+FETCH_CONCURRENCY = int(os.getenv('FETCH_CONCURRENCY', '6'))  # Maximum feeds fetched at the same time
+FEED_TIMEOUT_SECONDS = float(os.getenv('FEED_TIMEOUT_SECONDS', '15'))  # Socket timeout: connecting, and each wait for data
+FEED_DEADLINE_SECONDS = float(os.getenv('FEED_DEADLINE_SECONDS', '60'))  # Wall-clock budget for downloading one feed
+STREAM_PARSING = os.getenv('STREAM_PARSING', '0') == '1'  # Default for feeds without a 'streaming' key
+STREAM_CHUNK_SIZE = 16 * 1024  # Bytes read per step when stream parsing
+LINK_LOOKUP_BATCH_SIZE = 500  # Links checked per query when filtering out stored articles
+USER_AGENT = 'CryptoNews-Agregator/1.0 (+https://github.com/p3tr1nn1/CryptoNews-Agregator)'
+
+# ------------------------------
+# Feed Validator Cache
 # ------------------------------
-DATABASE_PATH = 'central_rss_articles.db'
-def setup_database():
-    """Sets up the database for storing articles."""
-    conn = sqlite3.connect(DATABASE_PATH)
+def load_feed_validators(conn):
+    """Returns a {url: (etag, last_modified)} map of the stored feed validators."""
     cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS articles (
-            title TEXT,
-            link TEXT PRIMARY KEY,
-            description TEXT,
-            publication_date TEXT,
-            content_url TEXT,
-            sent_to_discord BOOLEAN DEFAULT 0,
-            source TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    cursor.execute('SELECT url, etag, last_modified FROM feed_cache')
+    return {url: (etag, last_modified) for url, etag, last_modified in cursor.fetchall()}
+
+def save_feed_validators(conn, validators):
+    """Stores (url, etag, last_modified) rows, to be committed with the articles of the same run."""
+    conn.executemany('''
+        INSERT OR REPLACE INTO feed_cache (url, etag, last_modified)
+        VALUES (?, ?, ?)
+    ''', validators)
 
 # ------------------------------
-# Data Formatting Functions
+# High-Water Marks
 # ------------------------------
-def format_pub_date(pub_date_str):
-    """Formats the publication date to a sortable format."""
-    #Date is in this format: Fri, 12 Jan 2024 13:47:21 +0000
-    try:
-        return datetime.strptime(pub_date_str, '%a, %d %b %Y %H:%M:%S %z').strftime('%Y-%m-%d %H:%M:%S')
-    except ValueError:
-        return None
-    
-def format_defiant_pub_date(pub_date_str):
-    """Formats the publication date for The Defiant's feed."""
-    #Date is in this format: Tue, 12 Dec 2023 14:27:00 GMT
-    try:
-        # Convert to datetime object, considering the timezone
-        time_tuple = parsedate_tz(pub_date_str)
-        dt = datetime.fromtimestamp(mktime_tz(time_tuple))
-        return dt.strftime('%Y-%m-%d %H:%M:%S')
-    except Exception as e:
-        return 'Unknown'
+def load_high_water_marks(conn):
+    """Returns a {source: (published_at, link)} map of the newest article ingested per source."""
+    cursor = conn.cursor()
+    cursor.execute('SELECT source, last_published_at, last_link FROM feed_state')
+    return {source: (published_at, link) for source, published_at, link in cursor.fetchall()}
+
+def save_high_water_marks(conn, marks):
+    """Stores (source, published_at, link) rows, to be committed with the articles of the same run."""
+    conn.executemany('''
+        INSERT OR REPLACE INTO feed_state (source, last_published_at, last_publication_date, last_link)
+        VALUES (?, ?, ?, ?)
+    ''', [(source, published_at, dates.format_timestamp(published_at), link) for source, published_at, link in marks])
+
+def is_already_ingested(published_at, link, mark):
+    """Tells whether an entry is at or below the source's high-water mark."""
+    if mark is None:
+        return False
+    mark_published_at, mark_link = mark
+    if link == mark_link:
+        return True
+    # Entries published in the same second as the mark may still be new, INSERT OR IGNORE sorts them out
+    return published_at is not None and mark_published_at is not None and published_at < mark_published_at
+
+def newest_article(rows):
+    """Returns the (published_at, link) of the newest row with a known date, or None."""
+    dated = [(row['published_at'], row['link']) for row in rows if row['published_at'] is not None]
+    return max(dated) if dated else None
 
+# ------------------------------
+# Data Formatting Functions
+# ------------------------------
 def clean_html(raw_html):
     """Removes HTML tags and decodes HTML entities."""
     # Using regular expressions to remove HTML tags
@@ -72,292 +98,352 @@ def clean_html(raw_html):
     # Decoding HTML entities
     decoded = html.unescape(tag_free)
     return decoded
-# ------------------------------    
-# ------------------------------
-# RSS Feed Fetching Functions
-# ------------------------------
-# ------------------------------
-def fetch_and_store_coindesk_rss_feed():
-    """Fetches RSS feed from Coindesk and stores articles in the database."""
-    feed = feedparser.parse(COINDESK_RSS_URL)
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
-    for entry in feed.entries:
-        title = entry.title
-        link = entry.link
-        description = entry.description
-        pub_date = format_pub_date(entry.published)
-        content_url = entry.get('media_content', [{}])[0].get('url', 'No Image')
-
-        cursor.execute('''
-            INSERT OR IGNORE INTO articles (title, link, description, publication_date, content_url, sent_to_discord, source)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (title, link, description, pub_date, content_url, False, 'Coindesk'))
-
-    conn.commit()
-    conn.close()
-
-def fetch_and_store_defiant_rss_feed():
-    """Fetches RSS feed from The Defiant and stores articles in the database."""
-    feed = feedparser.parse(DEFIANT_RSS_URL)
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
 
-    for entry in feed.entries:
-        title = entry.title
-        link = entry.link
-        description = entry.description
-        pub_date = format_defiant_pub_date(entry.get('published', 'Unknown'))
-        thumbnail_url = entry.get('media_thumbnail', [{}])[0].get('url', 'No Image')
-
-        cursor.execute('''
-            INSERT OR IGNORE INTO articles (title, link, description, publication_date, content_url, sent_to_discord, source)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (title, link, description, pub_date, thumbnail_url, False, 'The Defiant'))
-
-    conn.commit()
-    conn.close()
-
-def fetch_and_store_investing_rss_feed():
-    """Fetches RSS feed from Investing and stores articles in the database."""
-    feed = feedparser.parse(INVESTING_RSS_URL)
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+def keep_description(raw_html):
+    """Keeps the description as published."""
+    return raw_html
 
-    for entry in feed.entries:
-        title = entry.title
-        link = entry.link
-        publication_date = datetime.strptime(entry.published, '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d %H:%M:%S')
-        content_url = entry.enclosures[0].href if entry.enclosures else 'No Image'
-
-        cursor.execute('''
-            INSERT OR IGNORE INTO articles (title, link, description, publication_date, content_url, sent_to_discord, source)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (title, link, '', publication_date, content_url, False, 'Investing.com'))
-
-    conn.commit()
-    conn.close()
-
-def fetch_and_store_bitcoinmagazine_rss_feed():
-    """Fetches RSS feed from Bitcoin Magazine and stores articles in the database."""
-    feed = feedparser.parse(BITCOINMAGAZINE_RSS_URL)
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+def drop_description(raw_html):
+    """Discards the description (used for feeds without a useful summary)."""
+    return ''
 
-    for entry in feed.entries:
-        title = entry.title
-        link = entry.link
-        description = entry.description
-        pub_date = format_defiant_pub_date(entry.published)        
-        content_url = entry.enclosures[0].url if entry.enclosures else 'No Image'
-
-        cursor.execute('''
-            INSERT OR IGNORE INTO articles (title, link, description, publication_date, content_url, sent_to_discord, source)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (title, link, description, pub_date, content_url, False, 'Bitcoin Magazine'))
-
-    conn.commit()
-    conn.close()
-
-def fetch_and_store_decrypt_rss_feed():
-    """Fetches RSS feed from Decrypt.co and stores articles in the database."""
-    feed = feedparser.parse(DECRYPT_RSS_URL)
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+def first_sentence(raw_html):
+    """Keeps only the first sentence of the cleaned description."""
+    description = clean_html(raw_html)
+    return description.split('.')[0] if '.' in description else description
 
-    for entry in feed.entries:
-        title = entry.title
-        link = entry.link
-        description = entry.description
-        pub_date = format_pub_date(entry.published)
-        content_url = entry.enclosures[0].url if entry.enclosures else 'No Image'
-        
-        cursor.execute('''
-        INSERT OR IGNORE INTO articles (title, link, description, publication_date, content_url, sent_to_discord, source)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (title, link, description, pub_date, content_url, False, 'Decrypt'))
-
-    conn.commit()
-    conn.close()
-
-def fetch_and_store_cryptoslate_rss_feed():
-    """Fetches RSS feed from CryptoSlate and stores articles in the database."""
-    feed = feedparser.parse(CRYPTOSLATE_RSS_URL)
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
-    for entry in feed.entries:
-        title = entry.title
-        link = entry.link        
-        description = clean_html(entry.description)        
-        pub_date = format_pub_date(entry.published)
-        content_url = entry.enclosures[0].url if entry.enclosures else 'No Image'
-
-        cursor.execute('''
-            INSERT OR IGNORE INTO articles (title, link, description, publication_date, content_url, sent_to_discord, source)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (title, link, description, pub_date, content_url, False, 'CryptoSlate'))
-
-    conn.commit()
-    conn.close()
-
-def fetch_and_store_crypto_briefing_rss_feed():
-    """Fetches RSS feed from Crypto Briefing and stores articles in the database."""
-    feed = feedparser.parse(CRYPTO_BRIEFING_RSS_URL)
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
-    for entry in feed.entries:
-        title = entry.title
-        link = entry.link
-        description = entry.description
-        pub_date = format_pub_date(entry.published)
-        # Extract content_url from media:content tag
-        content_url = entry.media_content[0]['url'] if 'media_content' in entry and len(entry.media_content) > 0 else 'No Image'
-
-        cursor.execute('''
-            INSERT OR IGNORE INTO articles (title, link, description, publication_date, content_url, sent_to_discord, source)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (title, link, description, pub_date, content_url, False, 'Crypto Briefing'))
-
-    conn.commit()
-    conn.close()
-
-def fetch_and_store_crypto_news_rss_feed():
-    """Fetches RSS feed from Crypto News and stores articles in the database."""
-    feed = feedparser.parse(CRYPTO_NEWS_RSS_URL)
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
-    for entry in feed.entries:
-        title = entry.title
-        link = entry.link
-        description = clean_html(entry.description)
-        pub_date = format_pub_date(entry.published)
-        content_url = entry.enclosures[0].url if entry.enclosures else 'No Image'
-
-        cursor.execute('''
-            INSERT OR IGNORE INTO articles (title, link, description, publication_date, content_url, sent_to_discord, source)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (title, link, description, pub_date, content_url, False, 'Crypto News'))
-
-    conn.commit()
-    conn.close()
-
-def fetch_and_store_bitcoinist_rss_feed():
-    """Fetches RSS feed from Bitcoinist and stores articles in the database."""
-    feed = feedparser.parse(BITCOINIST_RSS_URL)
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+# ------------------------------
+# Image Extraction Functions
+# ------------------------------
+# Each extractor receives the feed entry and the feed-level metadata (feed.feed)
+def media_content_image(entry, feed_info):
+    """Returns the URL of the first media:content tag."""
+    media_content = entry.get('media_content') or [{}]
+    return media_content[0].get('url', 'No Image')
+
+def media_thumbnail_image(entry, feed_info):
+    """Returns the URL of the first media:thumbnail tag."""
+    media_thumbnail = entry.get('media_thumbnail') or [{}]
+    return media_thumbnail[0].get('url', 'No Image')
+
+def enclosure_image(entry, feed_info):
+    """Returns the URL of the first enclosure."""
+    enclosures = entry.get('enclosures') or [{}]
+    return enclosures[0].get('href', 'No Image')
+
+def feed_logo_image(entry, feed_info):
+    """Returns the feed's own image, for feeds without per-article images."""
+    return (feed_info.get('image') or {}).get('href', 'No Image')
+
+def description_image(entry, feed_info):
+    """Returns the first <img> source found in the raw description."""
+    match = re.search(r'src="([^"]+)"', entry.get('description', ''))
+    return match.group(1) if match else 'No Image'
 
-    for entry in feed.entries:
-        title = entry.title
-        link = entry.link
-        description = entry.description
-        pub_date = format_pub_date(entry.published)
-        content_url = entry.media_content[0]['url'] if 'media_content' in entry and len(entry.media_content) > 0 else 'No Image'
-
-        cursor.execute('''
-            INSERT OR IGNORE INTO articles (title, link, description, publication_date, content_url, sent_to_discord, source)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (title, link, description, pub_date, content_url, False, 'Bitcoinist'))
-
-    conn.commit()
-    conn.close()
-
-def fetch_and_store_the_blockchain_rss_feed():
-    """Fetches RSS feed from The Blockchain and stores articles in the database."""
-    feed = feedparser.parse(THE_BLOCKCHAIN_RSS_URL)
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+# ------------------------------
+# Feed Registry
+# ------------------------------
+# Adding a source only needs a new entry here. Set 'streaming': True on a feed to parse it
+# incrementally while it downloads instead of with feedparser. Dates are read with
+# dates.parse_timestamp, a feed with an unusual format can set its own 'date_parser'
+# (text -> UTC epoch seconds or None).
+FEEDS = [
+    {'source': 'Coindesk', 'url': COINDESK_RSS_URL,
+     'image_extractor': media_content_image, 'description_cleaner': keep_description},
+    {'source': 'The Defiant', 'url': DEFIANT_RSS_URL,
+     'image_extractor': media_thumbnail_image, 'description_cleaner': keep_description},
+    {'source': 'Investing.com', 'url': INVESTING_RSS_URL,
+     'image_extractor': enclosure_image, 'description_cleaner': drop_description},
+    {'source': 'Bitcoin Magazine', 'url': BITCOINMAGAZINE_RSS_URL,
+     'image_extractor': enclosure_image, 'description_cleaner': keep_description},
+    {'source': 'Decrypt', 'url': DECRYPT_RSS_URL,
+     'image_extractor': enclosure_image, 'description_cleaner': keep_description},
+    {'source': 'CryptoSlate', 'url': CRYPTOSLATE_RSS_URL,
+     'image_extractor': enclosure_image, 'description_cleaner': clean_html},
+    {'source': 'Crypto Briefing', 'url': CRYPTO_BRIEFING_RSS_URL,
+     'image_extractor': media_content_image, 'description_cleaner': keep_description},
+    {'source': 'Crypto News', 'url': CRYPTO_NEWS_RSS_URL,
+     'image_extractor': enclosure_image, 'description_cleaner': clean_html},
+    {'source': 'Bitcoinist', 'url': BITCOINIST_RSS_URL,
+     'image_extractor': media_content_image, 'description_cleaner': keep_description},
+    {'source': 'The Blockchain', 'url': THE_BLOCKCHAIN_RSS_URL,
+     'image_extractor': feed_logo_image, 'description_cleaner': clean_html},
+    {'source': 'NewsBTC', 'url': NEWSBTC_RSS_URL,
+     'image_extractor': media_content_image, 'description_cleaner': first_sentence},
+    {'source': 'Bitcoin News', 'url': BITCOIN_NEWS_RSS_URL,
+     'image_extractor': description_image, 'description_cleaner': clean_html},
+]
 
+# ------------------------------
+# Ingest Pipeline
+# ------------------------------
+def request_headers(etag=None, last_modified=None):
+    """Builds the request headers, including the conditional GET validators when known."""
+    headers = {'User-Agent': USER_AGENT}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+def fetch_feed(url, etag=None, last_modified=None, source=None):
+    """Downloads and parses an RSS feed, or returns None if it has not changed since the last poll."""
+    source = source or url
+    deadline = time.monotonic() + FEED_DEADLINE_SECONDS
+    with metrics.timed('feed_fetch', source=source):
+        response = requests.get(url, headers=request_headers(etag, last_modified), timeout=FEED_TIMEOUT_SECONDS,
+                                stream=True)
+        with response:
+            if response.status_code == 304:
+                metrics.inc('feed_not_modified', source=source)
+                return None
+            response.raise_for_status()
+            content = b''.join(counted_chunks(response, source, deadline))
+
+    with metrics.timed('feed_parse', source=source):
+        feed = feedparser.parse(content)
+    if feed.bozo and not feed.entries:
+        # An error page or truncated body served with 200 is a failed poll, not an empty feed
+        raise ValueError(f'unparseable feed: {feed.bozo_exception}')
+    feed['etag'] = response.headers.get('ETag')
+    feed['modified'] = response.headers.get('Last-Modified')
+    return feed
+
+def parse_entry_date(feed_config, entry):
+    """Returns the publication time of an entry in UTC epoch seconds, or None."""
+    return feed_config.get('date_parser', dates.parse_timestamp)(entry.get('published', ''))
+
+def build_row(feed_config, entry, feed_info, published_at):
+    """Builds the article row for a feed entry."""
+    return {
+        'title': entry.get('title'),
+        'link': entry.get('link'),
+        'description': feed_config['description_cleaner'](entry.get('description', '')),
+        'publication_date': dates.format_timestamp(published_at),
+        'published_at': published_at,
+        'content_url': feed_config['image_extractor'](entry, feed_info),
+        'source': feed_config['source'],
+    }
+
+def skip_entry(feed_config, link, error):
+    """Reports an entry that could not be turned into a row; the rest of the feed is still used."""
+    print(f"Skipping entry {link} of {feed_config['source']}: {error}")
+    metrics.inc('feed_entry_errors', source=feed_config['source'])
+
+def normalize_entries(feed_config, feed, mark=None):
+    """Turns the entries of a parsed feed that are newer than the high-water mark into article rows."""
+    metrics.inc('feed_entries_seen', len(feed.entries), source=feed_config['source'])
+    rows = []
     for entry in feed.entries:
-        title = entry.title
-        link = entry.link
-        description = clean_html(entry.description)
-        pub_date = format_pub_date(entry.published)
-        content_url = feed.feed.image.url
-
-        cursor.execute('''
-            INSERT OR IGNORE INTO articles (title, link, description, publication_date, content_url, sent_to_discord, source)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (title, link, description, pub_date, content_url, False, 'The Blockchain'))
-
-    conn.commit()
-    conn.close()
-
-def fetch_and_store_newsbtc_rss_feed():
-    """Fetches RSS feed from NewsBTC and stores articles in the database."""    
-    feed = feedparser.parse(NEWSBTC_RSS_URL)
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+        link = entry.get('link')
+        if not link:
+            continue
+        try:
+            # Only the date is looked at for already ingested entries, the rest of the work is skipped
+            published_at = parse_entry_date(feed_config, entry)
+            if is_already_ingested(published_at, link, mark):
+                continue
+            rows.append(build_row(feed_config, entry, feed.feed, published_at))
+        except Exception as e:
+            skip_entry(feed_config, link, e)
+    return rows
+
+def stream_feed(feed_config, etag=None, last_modified=None, mark=None):
+    """Parses a feed while it downloads and stops reading at the first already ingested entry.
+
+    Returns (rows, etag, last_modified), or None if the feed has not changed since the last poll.
+    Meant for feeds that list their newest entries first. Download and parsing overlap,
+    so the whole read is timed as feed_parse.
+    """
+    source = feed_config['source']
+    deadline = time.monotonic() + FEED_DEADLINE_SECONDS
+    with metrics.timed('feed_fetch', source=source):
+        response = requests.get(feed_config['url'], headers=request_headers(etag, last_modified),
+                                timeout=FEED_TIMEOUT_SECONDS, stream=True)
+    with response, metrics.timed('feed_parse', source=source):
+        if response.status_code == 304:
+            metrics.inc('feed_not_modified', source=source)
+            return None
+        response.raise_for_status()
+
+        rows = []
+        feed_info = {}
+        for entry in streaming_feed.iter_entries(counted_chunks(response, source, deadline), feed_info):
+            metrics.inc('feed_entries_seen', source=source)
+            link = entry.get('link')
+            if not link:
+                continue
+            try:
+                published_at = parse_entry_date(feed_config, entry)
+                if is_already_ingested(published_at, link, mark):
+                    # Everything after this entry is older, the rest of the body is never downloaded
+                    break
+                rows.append(build_row(feed_config, entry, feed_info, published_at))
+            except Exception as e:
+                skip_entry(feed_config, link, e)
+        return rows, response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+def counted_chunks(response, source, deadline):
+    """Yields the body chunks of a streamed response, counting the bytes read.
+
+    FEED_TIMEOUT_SECONDS only bounds each wait for data, so a host trickling a few bytes at a
+    time could hold a fetch thread indefinitely. Raises TimeoutError once the monotonic clock
+    passes deadline; the last read may still take up to FEED_TIMEOUT_SECONDS beyond it.
+    """
+    # read1() returns whatever has arrived instead of waiting for a full chunk (urllib3 2)
+    read = getattr(response.raw, 'read1', None)
+    if read is not None:
+        chunks = iter(lambda: read(STREAM_CHUNK_SIZE, decode_content=True), b'')
+    else:
+        chunks = response.iter_content(STREAM_CHUNK_SIZE)
+    for chunk in chunks:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f'feed not downloaded within {FEED_DEADLINE_SECONDS:g}s')
+        metrics.inc('feed_bytes', len(chunk), source=source)
+        yield chunk
+
+def fetch_and_normalize(feed_config, etag=None, last_modified=None, mark=None):
+    """Fetches one feed and returns (rows, etag, last_modified), or None if it has not changed."""
+    if feed_config.get('streaming', STREAM_PARSING):
+        return stream_feed(feed_config, etag, last_modified, mark)
+    feed = fetch_feed(feed_config['url'], etag, last_modified, feed_config['source'])
+    if feed is None:
+        return None
+    with metrics.timed('feed_normalize', source=feed_config['source']):
+        rows = normalize_entries(feed_config, feed, mark)
+    return rows, feed.get('etag'), feed.get('modified')
 
-    for entry in feed.entries:
-        title = entry.title
-        link = entry.link
-        description = clean_html(entry.description)
-        first_sentence = description.split('.')[0] if '.' in description else description
-        description = first_sentence
-        pub_date = format_pub_date(entry.published)
-        # Extract the content URL from the media:content tag
-        media_content = entry.get('media_content', [])
-        if media_content:
-            content_url = media_content[0]['url']
-        else:
-            content_url = 'No Image'
-        
-        cursor.execute('''
-            INSERT OR IGNORE INTO articles (title, link, description, publication_date, content_url, sent_to_discord, source)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (title, link, description, pub_date, content_url, False, 'NewsBTC'))
-
-    conn.commit()
-    conn.close()
-
-def fetch_and_store_bitcoin_news_rss_feed():
-    """Fetches RSS feed from Bitcoin News and stores articles in the database."""
-    feed = feedparser.parse(BITCOIN_NEWS_RSS_URL)
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+def timed_fetch(feed_config, etag, last_modified, mark):
+    """Runs fetch_and_normalize() and returns (result, seconds, error) instead of raising."""
+    started = time.perf_counter()
+    try:
+        return fetch_and_normalize(feed_config, etag, last_modified, mark), time.perf_counter() - started, None
+    except Exception as e:
+        return None, time.perf_counter() - started, e
+
+def fetch_feeds(feeds, validators, marks, health=None):
+    """Fetches feeds concurrently and returns (feed_config, rows, etag, last_modified) for the ones that changed.
+
+    A failing feed is reported and left out, and never affects the others. When a
+    {source: health record} map is given, every poll's outcome and latency is recorded in it.
+    """
+    fetched = []
+    # Feeds are fetched concurrently so a run takes about as long as the slowest feed
+    with ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY) as executor:
+        futures = {
+            executor.submit(
+                timed_fetch, feed_config,
+                *validators.get(feed_config['url'], (None, None)),
+                marks.get(feed_config['source']),
+            ): feed_config
+            for feed_config in feeds
+        }
+        for future in as_completed(futures):
+            feed_config = futures[future]
+            result, latency, error = future.result()
+            now = time.time()
+            record = health.setdefault(feed_config['source'], feed_health.new_health()) if health is not None else None
+            if error is not None:
+                print(f"Failed to fetch {feed_config['source']}: {error}")
+                metrics.inc('feed_errors', source=feed_config['source'])
+                if record is not None:
+                    feed_health.record_failure(record, latency, error, now)
+                continue
+            if record is not None:
+                feed_health.record_success(record, latency, now)
+            if result is not None:
+                fetched.append((feed_config, *result))
+    return fetched
+
+def select_new_rows(conn, rows):
+    """Drops rows whose link is already stored or repeated earlier in the batch."""
+    links = list({row['link'] for row in rows})
+    known = set()
+    for start in range(0, len(links), LINK_LOOKUP_BATCH_SIZE):
+        batch = links[start:start + LINK_LOOKUP_BATCH_SIZE]
+        cursor = conn.execute(f"SELECT link FROM articles WHERE link IN ({','.join('?' * len(batch))})", batch)
+        known.update(link for link, in cursor.fetchall())
+
+    new_rows = []
+    for row in rows:
+        if row['link'] not in known:
+            known.add(row['link'])
+            new_rows.append(row)
+    return new_rows
+
+def store_articles(conn, rows):
+    """Inserts new article rows in a single batched statement and runs the article stages on them."""
+    new_rows = select_new_rows(conn, rows)
+    with metrics.timed('db_insert'):
+        conn.executemany('''
+            INSERT OR IGNORE INTO articles (title, link, description, publication_date, published_at, content_url, sent_to_discord, source)
+            VALUES (:title, :link, :description, :publication_date, :published_at, :content_url, 0, :source)
+        ''', new_rows)
+    for row in new_rows:
+        metrics.inc('articles_inserted', source=row['source'])
+    for stage in ARTICLE_STAGES:
+        with metrics.timed('article_stage', stage=stage.__name__):
+            stage(conn, new_rows)
+    return new_rows
+
+def ingest(feeds=FEEDS):
+    """Fetches the given feeds and stores their articles in one transaction; returns the new article rows."""
+    new_rows = []
+    conn = storage.connect()
+    try:
+        stored_health = feed_health.load_health(conn)
+        now = time.time()
+        # Feeds with an open circuit are skipped until their backoff runs out
+        polled = [feed_config for feed_config in feeds
+                  if feed_health.is_available(stored_health.get(feed_config['source']), now)]
+        for feed_config in feeds:
+            if feed_config not in polled:
+                print(f"Skipping {feed_config['source']}: circuit open after repeated failures")
+                metrics.inc('feed_skipped', source=feed_config['source'])
+        health = {feed_config['source']: stored_health.get(feed_config['source'], feed_health.new_health())
+                  for feed_config in polled}
+        fetched = fetch_feeds(polled, load_feed_validators(conn), load_high_water_marks(conn), health)
+
+        rows = []
+        validators = []
+        new_marks = []
+        for feed_config, feed_rows, etag, last_modified in fetched:
+            rows.extend(feed_rows)
+            validators.append((feed_config['url'], etag, last_modified))
+            newest = newest_article(feed_rows)
+            if newest:
+                new_marks.append((feed_config['source'], *newest))
+
+        with conn:
+            if rows:
+                new_rows = store_articles(conn, rows)
+            if new_rows:
+                storage.bump_generation(conn)
+            save_feed_validators(conn, validators)
+            save_high_water_marks(conn, new_marks)
+            feed_health.save_health(conn, health)
+            with metrics.timed('db_commit', stage='ingest'):
+                conn.commit()
+    finally:
+        conn.close()
+    return new_rows
+
+# Run inside the ingest transaction on the articles stored for the first time
+ARTICLE_STAGES = [
+    dedupe.assign_stories,  # Groups near-duplicate articles from different sources into stories
+    tagging.tag_articles,  # Indexes the coins each article mentions in article_tags
+]
 
-    for entry in feed.entries:
-        title = entry.title
-        link = entry.link
-        # Extracting the content URL from the 'description' tag
-        content_url = 'No Image'
-        description = entry.description
-        match = re.search(r'src="([^"]+)"', description)
-        if match:
-            content_url = match.group(1)
-
-        description = clean_html(entry.description)
-        pub_date = format_pub_date(entry.published)  
-        
-        cursor.execute('''
-            INSERT OR IGNORE INTO articles (title, link, description, publication_date, content_url, sent_to_discord, source)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (title, link, description, pub_date, content_url, False, 'Bitcoin News'))
-
-    conn.commit()
-    conn.close()
 # ------------------------------
 # Main Function
 # ------------------------------
 def main():
-    setup_database()
-    fetch_and_store_coindesk_rss_feed()
-    fetch_and_store_defiant_rss_feed()
-    fetch_and_store_investing_rss_feed()
-    fetch_and_store_bitcoinmagazine_rss_feed()
-    fetch_and_store_decrypt_rss_feed()
-    fetch_and_store_cryptoslate_rss_feed()
-    fetch_and_store_crypto_briefing_rss_feed()
-    fetch_and_store_crypto_news_rss_feed()
-    fetch_and_store_bitcoinist_rss_feed()
-    fetch_and_store_the_blockchain_rss_feed()
-    fetch_and_store_newsbtc_rss_feed()
-    fetch_and_store_bitcoin_news_rss_feed()    
+    storage.setup_database()
+    try:
+        with metrics.stage('ingest'):
+            ingest()
+    finally:
+        metrics.write_metrics_file('ingest')
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,214 @@
+import cProfile
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ------------------------------
+# Metrics Settings
+# ------------------------------
+METRICS_DIR = os.getenv('METRICS_DIR', 'metrics')  # One <job>.prom file per script, textfile-collector style
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+# Comma-separated stage names (or 'all') to capture with cProfile / tracemalloc
+PROFILE_STAGES = {stage.strip() for stage in os.getenv('PROFILE_STAGES', '').split(',') if stage.strip()}
+TRACEMALLOC_STAGES = {stage.strip() for stage in os.getenv('TRACEMALLOC_STAGES', '').split(',') if stage.strip()}
+TRACEMALLOC_TOP = 25  # Allocation sites written per tracemalloc snapshot
+METRIC_PREFIX = 'cryptonews_'
+
+# ------------------------------
+# Registry
+# ------------------------------
+lock = threading.Lock()
+counters = {}  # (name, labels) -> value
+timers = {}  # (name, labels) -> [count, sum, max]
+
+HELP_TEXTS = {
+    'feed_fetch': 'Time until a feed response arrived.',
+    'feed_parse': 'Time spent parsing a feed body.',
+    'feed_normalize': 'Time spent turning parsed entries into article rows.',
+    'feed_bytes': 'Feed body bytes read.',
+    'feed_entries_seen': 'Feed entries looked at.',
+    'feed_not_modified': 'Polls answered with 304 Not Modified.',
+    'feed_errors': 'Feed polls that failed.',
+    'feed_entry_errors': 'Feed entries skipped because they could not be read.',
+    'feed_skipped': 'Polls skipped because the feed circuit was open.',
+    'articles_inserted': 'Articles stored for the first time.',
+    'db_insert': 'Time spent inserting article rows.',
+    'db_commit': 'Time spent committing a stage transaction.',
+    'article_stage': 'Time spent in an article stage.',
+    'outbox_enqueued': 'Articles queued for Discord.',
+    'outbox_retried': 'Outbox items returned to the queue after a failed delivery.',
+    'outbox_expired': 'Outbox items failed because their lease ran out after the last attempt.',
+    'outbox_lease_lost': 'Claimed outbox items not sent because another sender had reclaimed them.',
+    'discord_messages_sent': 'Webhook messages accepted by Discord.',
+    'discord_embeds_sent': 'Embeds accepted by Discord.',
+    'discord_retries': 'Webhook requests repeated after a failed attempt.',
+    'discord_rate_limited': 'Webhook requests answered with 429.',
+    'discord_errors': 'Webhook requests that failed, by kind.',
+    'discord_request': 'Webhook request latency.',
+    'discord_rate_limit_wait': 'Time spent waiting for the rate limiter.',
+    'html_pages_written': 'HTML pages written.',
+    'stage': 'Wall time of a pipeline stage.',
+    'stage_failures': 'Daemon stages that raised.',
+    'image_fetch': 'Image download time.',
+    'image_fetch_errors': 'Images that could not be downloaded or were not images.',
+    'image_dedupe_hits': 'Downloaded images already cached under another URL.',
+    'image_bytes_stored': 'Thumbnail bytes written to the image cache.',
+    'image_evictions': 'Thumbnails evicted from the image cache.',
+    'api_requests': 'Read API requests, by endpoint and status.',
+    'api_cache_hits': 'Read API responses served from memory.',
+    'api_cache_misses': 'Read API responses rendered from SQLite.',
+    'articles_archived': 'Articles moved from the hot database to the monthly archives.',
+    'articles_exported': 'Articles written to NDJSON or Parquet exports.',
+    'feed_files_written': 'RSS and Atom feed files written (each with a gzip copy).',
+    'feed_item_cache_misses': 'Feed items serialized because they were not cached.',
+    'archive_month': 'Time spent archiving one month.',
+}
+
+def label_key(labels):
+    """Turns keyword labels into a hashable, ordered key."""
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def inc(name, value=1, **labels):
+    """Adds value to a counter."""
+    key = (name, label_key(labels))
+    with lock:
+        counters[key] = counters.get(key, 0) + value
+
+def observe(name, seconds, **labels):
+    """Records one duration for a timer."""
+    key = (name, label_key(labels))
+    with lock:
+        timer = timers.setdefault(key, [0, 0.0, 0.0])
+        timer[0] += 1
+        timer[1] += seconds
+        timer[2] = max(timer[2], seconds)
+
+@contextmanager
+def timed(name, **labels):
+    """Times the enclosed block into a timer."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+# ------------------------------
+# Prometheus Exposition
+# ------------------------------
+def format_labels(labels):
+    """Formats a label key as {name="value",...}."""
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+def render():
+    """Returns all metrics in the Prometheus text format."""
+    with lock:
+        counter_items = sorted(counters.items())
+        timer_items = sorted((key, list(value)) for key, value in timers.items())
+
+    lines = []
+    seen = set()
+    for (name, labels), value in counter_items:
+        metric = f'{METRIC_PREFIX}{name}_total'
+        if metric not in seen:
+            seen.add(metric)
+            if name in HELP_TEXTS:
+                lines.append(f'# HELP {metric} {HELP_TEXTS[name]}')
+            lines.append(f'# TYPE {metric} counter')
+        lines.append(f'{metric}{format_labels(labels)} {value}')
+    for (name, labels), (count, total, maximum) in timer_items:
+        metric = f'{METRIC_PREFIX}{name}_seconds'
+        if metric not in seen:
+            seen.add(metric)
+            if name in HELP_TEXTS:
+                lines.append(f'# HELP {metric} {HELP_TEXTS[name]}')
+            lines.append(f'# TYPE {metric} summary')
+        lines.append(f'{metric}_count{format_labels(labels)} {count}')
+        lines.append(f'{metric}_sum{format_labels(labels)} {total:.6f}')
+    # Summaries have no max sample, so the slowest observation is its own gauge family
+    for (name, labels), (count, total, maximum) in timer_items:
+        metric = f'{METRIC_PREFIX}{name}_seconds_max'
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f'# TYPE {metric} gauge')
+        lines.append(f'{metric}{format_labels(labels)} {maximum:.6f}')
+    return '\n'.join(lines) + '\n'
+
+def write_metrics_file(job):
+    """Writes the metrics of this process to METRICS_DIR/<job>.prom, atomically."""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f'{job}.prom')
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as file:
+        file.write(render())
+    os.replace(temp_path, path)
+    return path
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves /metrics in the Prometheus text format."""
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(port, host='127.0.0.1'):
+    """Starts a background /metrics endpoint; returns the server."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# ------------------------------
+# Stage Profiling
+# ------------------------------
+def wants(stages, stage):
+    """Tells whether a stage is selected by a PROFILE_STAGES-style set."""
+    return stage in stages or 'all' in stages
+
+@contextmanager
+def stage(name):
+    """Times a pipeline stage, and profiles it when selected in PROFILE_STAGES / TRACEMALLOC_STAGES.
+
+    cProfile output goes to PROFILE_DIR/<stage>-<timestamp>.prof (open it with pstats or snakeviz),
+    the tracemalloc top allocation sites to PROFILE_DIR/<stage>-<timestamp>-memory.txt.
+    """
+    profiler = cProfile.Profile() if wants(PROFILE_STAGES, name) else None
+    trace_memory = wants(TRACEMALLOC_STAGES, name) and not tracemalloc.is_tracing()
+    if trace_memory:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('stage', time.perf_counter() - started, stage=name)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        if profiler:
+            profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PROFILE_DIR, f'{name}-{stamp}.prof'))
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            with open(os.path.join(PROFILE_DIR, f'{name}-{stamp}-memory.txt'), 'w') as file:
+                file.write(f'current={current} peak={peak}\n')
+                for statistic in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+                    file.write(f'{statistic}\n')
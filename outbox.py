@@ -0,0 +1,146 @@
+import os
+import socket
+import time
+
+import metrics
+import routing
+
+# ------------------------------
+# Outbox Settings
+# ------------------------------
+CLAIM_LEASE_SECONDS = 300  # A claimed item returns to the queue if it is not acked in time; renewed before each send
+MAX_ATTEMPTS = 5  # Deliveries tried before an item is marked failed
+RETRY_BASE_SECONDS = 30  # Doubled after every failed attempt
+
+# ------------------------------
+# Outbox Queue
+# ------------------------------
+# Every article handed to Discord gets one outbox row per webhook target it is routed to. Its
+# status moves pending -> claimed -> sent, or back to pending (with a delay) after a failed
+# delivery, and to failed once MAX_ATTEMPTS is reached. available_at is when a pending row may
+# be claimed, or when the lease of a claimed row runs out.
+def worker_id():
+    """Returns an identifier for this sender process."""
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+def enqueue_unsent(conn, routes=None):
+    """Moves unsent articles into the outbox in one transaction; returns how many items were queued.
+
+    Only the first article of each story is queued, once for every route it matches, but every
+    unsent article is marked as handed off, so the unsent partial index only ever holds
+    articles not yet looked at. routes defaults to routing.load_routes().
+    """
+    routes = routing.load_routes() if routes is None else routes
+    with conn:
+        cursor = conn.execute('''
+            SELECT id, title, description, source,
+                   (SELECT group_concat(coin) FROM article_tags WHERE article_id = articles.id) AS coins
+            FROM articles
+            WHERE sent_to_discord = 0 AND (story_id IS NULL OR story_id = link)
+            ORDER BY published_at ASC NULLS LAST
+        ''')
+        columns = [column[0] for column in cursor.description]
+        items = []
+        for row in cursor.fetchall():
+            article = dict(zip(columns, row))
+            article['coins'] = set(article['coins'].split(',')) if article['coins'] else set()
+            items.extend((article['id'], route.name) for route in routes if route.matches(article))
+        cursor = conn.executemany('''
+            INSERT OR IGNORE INTO outbox (article_id, target, status, available_at) VALUES (?, ?, 'pending', 0)
+        ''', items)
+        queued = cursor.rowcount
+        conn.execute('UPDATE articles SET sent_to_discord = 1 WHERE sent_to_discord = 0')
+        with metrics.timed('db_commit', stage='export'):
+            conn.commit()
+    metrics.inc('outbox_enqueued', queued)
+    return queued
+
+def claim_batch(conn, claimed_by, size, target=routing.DEFAULT_TARGET):
+    """Claims up to size ready items of a webhook target, oldest first, and returns them as article dicts.
+
+    Each dict also carries its 'outbox_id'. Claims are taken under the write lock,
+    so concurrent senders never get the same item. An item whose lease ran out after its
+    last allowed attempt (its sender died or hung) is failed instead of claimed again.
+    """
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        cursor = conn.execute('''
+            UPDATE outbox SET status = 'failed', last_error = COALESCE(last_error, 'lease expired')
+            WHERE target = ? AND status = 'claimed' AND available_at <= ? AND attempts >= ?
+        ''', (target, now, MAX_ATTEMPTS))
+        if cursor.rowcount:
+            metrics.inc('outbox_expired', cursor.rowcount)
+        cursor = conn.execute('''
+            SELECT id FROM outbox
+            WHERE target = ? AND status IN ('pending', 'claimed') AND available_at <= ? AND attempts < ?
+            ORDER BY id LIMIT ?
+        ''', (target, now, MAX_ATTEMPTS, size))
+        ids = [outbox_id for outbox_id, in cursor.fetchall()]
+        if not ids:
+            conn.commit()
+            return []
+        placeholders = ','.join('?' * len(ids))
+        conn.execute(f'''
+            UPDATE outbox SET status = 'claimed', claimed_by = ?, available_at = ?, attempts = attempts + 1
+            WHERE id IN ({placeholders})
+        ''', [claimed_by, now + CLAIM_LEASE_SECONDS] + ids)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    cursor = conn.execute(f'''
+        SELECT o.id AS outbox_id, a.title, a.link, a.description, a.publication_date, a.content_url, a.source
+        FROM outbox o JOIN articles a ON a.id = o.article_id
+        WHERE o.id IN ({placeholders})
+        ORDER BY o.id
+    ''', ids)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def renew(conn, outbox_ids, claimed_by):
+    """Extends the lease of claimed items before they are sent; returns the ids still held.
+
+    A batch is sent one message at a time, so later items would otherwise wait on the
+    earlier messages' retries and could be reclaimed, and sent twice, by another sender.
+    Items that were reclaimed in the meantime are not returned and must not be sent.
+    """
+    placeholders = ','.join('?' * len(outbox_ids))
+    with conn:
+        conn.execute(f'''
+            UPDATE outbox SET available_at = ?
+            WHERE id IN ({placeholders}) AND claimed_by = ? AND status = 'claimed'
+        ''', [time.time() + CLAIM_LEASE_SECONDS] + list(outbox_ids) + [claimed_by])
+        cursor = conn.execute(f'''
+            SELECT id FROM outbox WHERE id IN ({placeholders}) AND claimed_by = ? AND status = 'claimed'
+        ''', list(outbox_ids) + [claimed_by])
+        return {outbox_id for outbox_id, in cursor.fetchall()}
+
+def ack(conn, outbox_ids, claimed_by):
+    """Marks delivered items as sent."""
+    placeholders = ','.join('?' * len(outbox_ids))
+    with conn:
+        conn.execute(f'''
+            UPDATE outbox SET status = 'sent', sent_at = ?, last_error = NULL
+            WHERE id IN ({placeholders}) AND claimed_by = ?
+        ''', [time.time()] + list(outbox_ids) + [claimed_by])
+
+def retry(conn, outbox_ids, claimed_by, error):
+    """Returns undelivered items to the queue with exponential backoff, or fails them after MAX_ATTEMPTS."""
+    placeholders = ','.join('?' * len(outbox_ids))
+    with conn:
+        conn.execute(f'''
+            UPDATE outbox SET
+                status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                available_at = ? + ? * (1 << (attempts - 1)),
+                last_error = ?
+            WHERE id IN ({placeholders}) AND claimed_by = ?
+        ''', [MAX_ATTEMPTS, time.time(), RETRY_BASE_SECONDS, error] + list(outbox_ids) + [claimed_by])
+
+def pending_count(conn, target=None):
+    """Returns how many items are waiting or being delivered, for one target or all of them."""
+    if target is None:
+        return conn.execute("SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'claimed')").fetchone()[0]
+    return conn.execute("SELECT COUNT(*) FROM outbox WHERE target = ? AND status IN ('pending', 'claimed')",
+                        (target,)).fetchone()[0]
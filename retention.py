@@ -0,0 +1,351 @@
+import heapq
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+import dedupe
+import metrics
+import storage
+
+# ------------------------------
+# Retention Settings
+# ------------------------------
+RETENTION_DAYS = float(os.getenv('RETENTION_DAYS', '90'))  # Articles older than this leave the hot database
+ARCHIVE_DB_DIR = os.getenv('ARCHIVE_DB_DIR', 'article_archives')  # One articles-YYYY-MM.db per month
+ARCHIVE_BATCH_SIZE = 2000  # Articles moved per transaction
+INCREMENTAL_VACUUM_PAGES = int(os.getenv('INCREMENTAL_VACUUM_PAGES', '10000'))  # Free pages returned per run
+ARCHIVE_FILE_PATTERN = re.compile(r'^articles-(\d{4}-\d{2})\.db$')
+ARTICLE_COLUMNS = 'id, title, link, description, publication_date, published_at, content_url, source, story_id'
+ARCHIVED_COUNTS_STATE_NAME = 'archived_counts'  # Articles moved to the archives so far, per source
+
+ARCHIVE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS archive.articles (
+        id INTEGER PRIMARY KEY,
+        title TEXT,
+        link TEXT NOT NULL UNIQUE,
+        description TEXT,
+        publication_date TEXT,
+        published_at INTEGER,
+        content_url TEXT,
+        source TEXT,
+        story_id TEXT
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS archive.idx_articles_published_at ON articles (published_at)',
+    'CREATE INDEX IF NOT EXISTS archive.idx_articles_source_published_at ON articles (source, published_at)',
+    'CREATE INDEX IF NOT EXISTS archive.idx_articles_source ON articles (source, id)',
+    # Archived articles stay searchable: each archive has its own full-text index, filled by a trigger
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS archive.articles_fts USING fts5(
+        title, description, source,
+        content='articles', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS archive.articles_fts_insert AFTER INSERT ON articles BEGIN
+        INSERT INTO articles_fts (rowid, title, description, source)
+        VALUES (new.id, new.title, new.description, new.source);
+    END
+    ''',
+]
+
+# ------------------------------
+# Archive Files
+# ------------------------------
+# Articles are moved out of the hot database once they are older than RETENTION_DAYS and
+# delivered. Each month of archived articles is its own SQLite file, so the hot database and
+# its indexes stay the same size however long the aggregator runs, and a query for recent
+# articles never opens an archive.
+def archive_path(month):
+    """Returns the archive database file of a month ('YYYY-MM')."""
+    return os.path.join(ARCHIVE_DB_DIR, f'articles-{month}.db')
+
+def archive_months():
+    """Returns the months that have an archive file, oldest first."""
+    if not os.path.isdir(ARCHIVE_DB_DIR):
+        return []
+    return sorted(match.group(1) for match in map(ARCHIVE_FILE_PATTERN.match, os.listdir(ARCHIVE_DB_DIR)) if match)
+
+def month_bounds(month):
+    """Returns the [start, end) epoch seconds of a month ('YYYY-MM')."""
+    year, number = map(int, month.split('-'))
+    start = datetime(year, number, 1, tzinfo=timezone.utc)
+    end = datetime(year + number // 12, number % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp()), int(end.timestamp())
+
+# ------------------------------
+# Archiving
+# ------------------------------
+def expired_months(conn, cutoff):
+    """Returns the months that have articles ready to be archived."""
+    cursor = conn.execute('''
+        SELECT DISTINCT strftime('%Y-%m', published_at, 'unixepoch') FROM articles
+        WHERE published_at < ? AND sent_to_discord = 1
+    ''', (cutoff,))
+    return sorted(month for month, in cursor.fetchall())
+
+def expired_ids(conn, cutoff, month):
+    """Returns the ids of up to ARCHIVE_BATCH_SIZE archivable articles of a month.
+
+    Articles not yet handed to the outbox, or still waiting there, stay in the hot database.
+    """
+    start, end = month_bounds(month)
+    cursor = conn.execute('''
+        SELECT a.id FROM articles a
+        WHERE a.published_at >= ? AND a.published_at < ? AND a.published_at < ? AND a.sent_to_discord = 1
+          AND NOT EXISTS (
+              SELECT 1 FROM outbox o WHERE o.article_id = a.id AND o.status IN ('pending', 'claimed')
+          )
+        LIMIT ?
+    ''', (start, end, cutoff, ARCHIVE_BATCH_SIZE))
+    return [article_id for article_id, in cursor.fetchall()]
+
+def delete_articles(conn, ids):
+    """Deletes articles and the rows that only exist for them (committed by the caller)."""
+    placeholders = ','.join('?' * len(ids))
+    links = [link for link, in conn.execute(f'SELECT link FROM articles WHERE id IN ({placeholders})', ids)]
+    link_placeholders = ','.join('?' * len(links))
+    dedupe.unindex_articles(conn, ids)
+    conn.execute(f'DELETE FROM article_words WHERE link IN ({link_placeholders})', links)
+    conn.execute(f'DELETE FROM outbox WHERE article_id IN ({placeholders})', ids)
+    conn.execute(f'DELETE FROM article_tags WHERE article_id IN ({placeholders})', ids)
+    # The FTS rows go with them through the articles_fts_delete trigger
+    conn.execute(f'DELETE FROM articles WHERE id IN ({placeholders})', ids)
+
+def create_archive_schema(conn):
+    """Creates or upgrades the schema of the attached archive database."""
+    with conn:
+        had_index = conn.execute(
+            "SELECT 1 FROM archive.sqlite_master WHERE name = 'articles_fts'").fetchone() is not None
+        for statement in ARCHIVE_SCHEMA:
+            conn.execute(statement)
+        if not had_index:
+            # Also fills the index of archives written before they had one
+            conn.execute("INSERT INTO archive.articles_fts (articles_fts) VALUES ('rebuild')")
+
+def upgrade_archives(conn):
+    """Brings every archive file to the current schema."""
+    for month in archive_months():
+        conn.execute('ATTACH DATABASE ? AS archive', (archive_path(month),))
+        try:
+            create_archive_schema(conn)
+        finally:
+            conn.execute('DETACH DATABASE archive')
+
+def archive_month(conn, cutoff, month):
+    """Moves a month's expired articles into its archive file; returns how many were moved.
+
+    The copy is committed to the archive before the articles are deleted from the hot
+    database, so a crash in between only leaves rows that the next run skips and deletes.
+    """
+    os.makedirs(ARCHIVE_DB_DIR, exist_ok=True)
+    conn.execute('ATTACH DATABASE ? AS archive', (archive_path(month),))
+    moved = 0
+    try:
+        create_archive_schema(conn)
+        while True:
+            ids = expired_ids(conn, cutoff, month)
+            if not ids:
+                return moved
+            placeholders = ','.join('?' * len(ids))
+            with conn:
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO archive.articles ({ARTICLE_COLUMNS})
+                    SELECT {ARTICLE_COLUMNS} FROM main.articles WHERE id IN ({placeholders})
+                ''', ids)
+            with conn:
+                add_archived_counts(conn, ids)
+                delete_articles(conn, ids)
+                storage.bump_generation(conn)
+            moved += len(ids)
+    finally:
+        conn.execute('DETACH DATABASE archive')
+
+def add_archived_counts(conn, ids):
+    """Adds articles about to be archived to the per-source archived counts (committed by the caller)."""
+    counts = archived_counts(conn)
+    placeholders = ','.join('?' * len(ids))
+    for source, count in conn.execute(
+            f'SELECT source, COUNT(*) FROM articles WHERE id IN ({placeholders}) GROUP BY source', ids):
+        counts[source or ''] = counts.get(source or '', 0) + count
+    storage.set_state(conn, ARCHIVED_COUNTS_STATE_NAME, counts)
+
+def archived_counts(conn):
+    """Returns {source: articles archived}, counted from the archive files the first time."""
+    counts = storage.get_state(conn, ARCHIVED_COUNTS_STATE_NAME)
+    if counts is not None:
+        return counts
+    counts = {}
+    for month in archive_months():
+        archive = open_archive(month)
+        try:
+            for source, count in archive.execute('SELECT source, COUNT(*) FROM articles GROUP BY source'):
+                counts[source or ''] = counts.get(source or '', 0) + count
+        finally:
+            archive.close()
+    return counts
+
+# ------------------------------
+# Space Reclamation
+# ------------------------------
+def enable_incremental_vacuum(conn):
+    """Switches the database to auto_vacuum = INCREMENTAL; returns True if a full VACUUM was needed.
+
+    The mode of an existing database only changes through one VACUUM, which rewrites the file.
+    Article ids are explicit columns, so the rewrite does not renumber anything the FTS index,
+    the outbox or the HTML build state refer to.
+    """
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return False
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+    return True
+
+def reclaim_space(conn):
+    """Returns free pages to the file system and truncates the WAL; returns the pages freed."""
+    free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    if free_pages:
+        conn.execute(f'PRAGMA incremental_vacuum({INCREMENTAL_VACUUM_PAGES})').fetchall()
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return free_pages - conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+def run_retention(conn, now=None):
+    """Archives expired articles, compacts the FTS index and reclaims the freed pages; returns how many were moved."""
+    cutoff = int((now or time.time()) - RETENTION_DAYS * 86400)
+    if storage.get_state(conn, ARCHIVED_COUNTS_STATE_NAME) is None:
+        # Archives written before the counts were kept are counted and indexed once, before anything is added
+        upgrade_archives(conn)
+        with conn:
+            storage.set_state(conn, ARCHIVED_COUNTS_STATE_NAME, archived_counts(conn))
+    moved = 0
+    for month in expired_months(conn, cutoff):
+        with metrics.timed('archive_month'):
+            count = archive_month(conn, cutoff, month)
+        if count:
+            print(f"Archived {count} articles to {archive_path(month)}")
+        moved += count
+    metrics.inc('articles_archived', moved)
+
+    if moved:
+        with conn:
+            conn.execute("INSERT INTO articles_fts (articles_fts) VALUES ('optimize')")
+    if enable_incremental_vacuum(conn):
+        print("Database switched to incremental vacuum.")
+    reclaim_space(conn)
+    return moved
+
+# ------------------------------
+# Unified Queries
+# ------------------------------
+def select_articles(conn, source=None, since=None, until=None, before=None, limit=50):
+    """Queries one database (hot or archive) for dated articles, newest first."""
+    sql = f'SELECT {ARTICLE_COLUMNS} FROM articles WHERE published_at IS NOT NULL'
+    args = []
+    if source is not None:
+        sql += ' AND source = ?'
+        args.append(source)
+    if since is not None:
+        sql += ' AND published_at >= ?'
+        args.append(since)
+    if until is not None:
+        sql += ' AND published_at < ?'
+        args.append(until)
+    if before is not None:
+        sql += ' AND (published_at, id) < (?, ?)'
+        args.extend(before)
+    sql += ' ORDER BY published_at DESC, id DESC LIMIT ?'
+    args.append(limit)
+    cursor = conn.execute(sql, args)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def open_archive(month):
+    """Opens a month's archive database read-only."""
+    return sqlite3.connect(f'file:{archive_path(month)}?mode=ro', uri=True)
+
+_archive_max_ids = {}  # month: (file mtime, highest article id)
+
+def archive_max_id(month):
+    """Returns the highest article id in a month's archive, cached until the file changes."""
+    mtime = os.stat(archive_path(month)).st_mtime_ns
+    cached = _archive_max_ids.get(month)
+    if cached is None or cached[0] != mtime:
+        archive = open_archive(month)
+        try:
+            cached = (mtime, archive.execute('SELECT COALESCE(MAX(id), 0) FROM articles').fetchone()[0])
+        finally:
+            archive.close()
+        _archive_max_ids[month] = cached
+    return cached[1]
+
+def iter_section(conn, source, columns, start_id=0):
+    """Yields the articles of a source (every source for None) with id >= start_id, in id order.
+
+    Rows come from the hot database and the archives holding such ids, merged as they are
+    read. columns must start with id.
+    """
+    sql = f'SELECT {columns} FROM articles WHERE id >= ?'
+    params = [start_id]
+    if source is not None:
+        sql += ' AND source = ?'
+        params.append(source)
+    sql += ' ORDER BY id'
+    archives = [open_archive(month) for month in archive_months() if archive_max_id(month) >= start_id]
+    try:
+        last_id = None
+        for row in heapq.merge(*(db.execute(sql, params) for db in [conn] + archives), key=lambda row: row[0]):
+            # An article copied but not yet deleted by an interrupted run is in both
+            if row[0] != last_id:
+                last_id = row[0]
+                yield row
+    finally:
+        for archive in archives:
+            archive.close()
+
+def newest(found, limit):
+    """Returns the newest articles of an {id: article} map."""
+    return sorted(found.values(), key=lambda article: (article['published_at'], article['id']), reverse=True)[:limit]
+
+def query_articles(conn, source=None, since=None, until=None, before=None, limit=50):
+    """Lists articles newest first across the hot database and the monthly archives.
+
+    since/until are epoch seconds, before a (published_at, id) keyset cursor. Archive files
+    are only opened for months the range reaches that can still contribute to the page.
+    """
+    found = {}
+    for article in select_articles(conn, source, since, until, before, limit):
+        found[article['id']] = article
+    for month in reversed(archive_months()):
+        start, end = month_bounds(month)
+        if since is not None and end <= since:
+            break
+        if (until is not None and start >= until) or (before is not None and start > before[0]):
+            continue
+        if len(found) >= limit and newest(found, limit)[-1]['published_at'] >= end:
+            break
+        archive = open_archive(month)
+        try:
+            for article in select_articles(archive, source, since, until, before, limit):
+                # An article copied but not yet deleted by an interrupted run is in both
+                found.setdefault(article['id'], article)
+        finally:
+            archive.close()
+    return newest(found, limit)
+
+def main():
+    storage.setup_database()
+    conn = storage.connect()
+    try:
+        with metrics.stage('retention'):
+            moved = run_retention(conn)
+    finally:
+        conn.close()
+        metrics.write_metrics_file('retention')
+    if not moved:
+        print(f"No articles older than {RETENTION_DAYS:g} days to archive.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import json
+import os
+import re
+
+# ------------------------------
+# Routing Settings
+# ------------------------------
+DISCORD_WEBHOOK_URL = os.getenv('DISCORD_WEBHOOK_URL')
+ROUTES_PATH = os.getenv('DISCORD_ROUTES_PATH', 'discord_routes.json')
+DEFAULT_TARGET = 'default'  # Route used when there is no routing table
+
+# ------------------------------
+# Routes
+# ------------------------------
+# The routing table is a JSON list of webhook targets, for example:
+#   [{"name": "btc", "url_env": "BTC_WEBHOOK_URL", "keywords": ["bitcoin", "btc"]},
+#    {"name": "defi", "url_env": "DEFI_WEBHOOK_URL", "sources": ["The Defiant"], "keywords": ["defi"],
+#     "exclude_keywords": ["sponsored"]},
+#    {"name": "eth", "url_env": "ETH_WEBHOOK_URL", "coins": ["ETH"]}]
+# An article goes to every route it matches; a route without filters gets everything. Coins are
+# the tags tagging.py stored for the article, so a coin filter needs no text matching at all.
+def keyword_pattern(keywords):
+    """Compiles keywords into one case-insensitive whole-word regex, or None if there are none."""
+    if not keywords:
+        return None
+    # Longest first, so "bitcoin cash" wins over "bitcoin" inside the alternation
+    alternatives = '|'.join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True))
+    return re.compile(rf'(?<!\w)(?:{alternatives})(?!\w)', re.IGNORECASE)
+
+class Route:
+    """A webhook target with the source, coin and keyword filters deciding which articles it gets.
+
+    Filters are compiled once when the route is built, matching an article is one set lookup
+    and at most two regex searches.
+    """
+
+    def __init__(self, name, url, sources=None, keywords=None, exclude_keywords=None, coins=None):
+        self.name = name
+        self.url = url
+        self.sources = frozenset(sources) if sources else None
+        self.coins = frozenset(coin.upper() for coin in coins) if coins else None
+        self.include = keyword_pattern(keywords)
+        self.exclude = keyword_pattern(exclude_keywords)
+
+    def matches(self, article):
+        """Tells whether an article (a dict with source, title, description and coins) goes to this route."""
+        if self.sources is not None and article['source'] not in self.sources:
+            return False
+        if self.coins is not None and self.coins.isdisjoint(article.get('coins', ())):
+            return False
+        if self.include is None and self.exclude is None:
+            return True
+        text = re.sub('<[^>]*>', ' ', f"{article['title'] or ''}\n{article['description'] or ''}")
+        if self.include is not None and not self.include.search(text):
+            return False
+        return self.exclude is None or not self.exclude.search(text)
+
+def load_routes(path=ROUTES_PATH):
+    """Reads the routing table; without one, everything goes to DISCORD_WEBHOOK_URL.
+
+    The default route is returned even when DISCORD_WEBHOOK_URL is unset, so articles keep
+    queueing until a webhook is configured.
+    """
+    if not os.path.exists(path):
+        return [Route(DEFAULT_TARGET, DISCORD_WEBHOOK_URL)]
+    with open(path) as file:
+        config = json.load(file)
+
+    routes = []
+    for entry in config:
+        if any(route.name == entry['name'] for route in routes):
+            raise ValueError(f"Duplicate route name in {path}: {entry['name']}")
+        # Webhook URLs are secrets, so the table can name an environment variable instead
+        url = entry.get('url') or os.getenv(entry.get('url_env', ''))
+        routes.append(Route(entry['name'], url, entry.get('sources'), entry.get('keywords'),
+                            entry.get('exclude_keywords'), entry.get('coins')))
+    return routes
@@ -0,0 +1,149 @@
+import argparse
+import re
+import sqlite3
+
+import dates
+import retention
+import storage
+
+DEFAULT_LIMIT = 20
+# Column weights for bm25(): a match in the title counts more than one in the description or source
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+SOURCE_WEIGHT = 2.0
+
+def to_match_query(text):
+    """Turns plain search words into an FTS5 query that matches all of them.
+
+    Each word is quoted so user input can't be read as FTS5 syntax; a trailing * keeps prefix search.
+    """
+    terms = []
+    for word in re.findall(r'[\w$]+\*?', text):
+        prefix = word.endswith('*')
+        word = word.rstrip('*')
+        terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return ' '.join(terms)
+
+def encode_cursor(score, article_id):
+    """Builds the opaque cursor pointing after a result."""
+    return f'{score!r}:{article_id}'
+
+def decode_cursor(cursor):
+    """Reverses encode_cursor()."""
+    score, article_id = cursor.rsplit(':', 1)
+    return float(score), int(article_id)
+
+def search_database(db, match, source=None, since=None, until=None, after=None, limit=DEFAULT_LIMIT):
+    """Runs a ranked full-text query against one database (hot or archive), best matches first."""
+    sql = f'''
+        SELECT a.id, a.title, a.link, a.source, a.publication_date,
+               bm25(articles_fts, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}, {SOURCE_WEIGHT}) AS score,
+               snippet(articles_fts, 1, '[', ']', '...', 16) AS excerpt
+        FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid
+        WHERE articles_fts MATCH ?
+    '''
+    params = [match]
+    if source:
+        sql += ' AND a.source = ?'
+        params.append(source)
+    if since is not None:
+        sql += ' AND a.published_at >= ?'
+        params.append(since)
+    if until is not None:
+        sql += ' AND a.published_at < ?'
+        params.append(until)
+    if after:
+        sql += ' AND (score, a.id) > (?, ?)'
+        params.extend(after)
+    # Lower bm25 scores are better matches
+    sql += ' ORDER BY score, a.id LIMIT ?'
+    params.append(limit)
+
+    cursor = db.execute(sql, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def search(conn, query, source=None, since=None, until=None, limit=DEFAULT_LIMIT, cursor=None, raw=False):
+    """Runs a ranked full-text search over the article archive.
+
+    since and until are UTC epoch seconds, compared against the indexed published_at.
+    Articles moved to the monthly archive databases are searched too, in the archives whose
+    month the date range reaches; each archive ranks its matches against its own articles.
+    Pagination is keyset based: pass the returned cursor to get the next page.
+    Returns (results, next_cursor); next_cursor is None on the last page, and a query without
+    any words finds nothing. A malformed raw query raises sqlite3.OperationalError and a
+    malformed cursor ValueError.
+    """
+    match = query if raw else to_match_query(query)
+    if not match.strip():
+        return [], None
+    after = decode_cursor(cursor) if cursor else None
+
+    found = {}
+    for result in search_database(conn, match, source, since, until, after, limit + 1):
+        found[result['id']] = result
+    for month in retention.archive_months():
+        start, end = retention.month_bounds(month)
+        if (since is not None and end <= since) or (until is not None and start >= until):
+            continue
+        archive = retention.open_archive(month)
+        try:
+            if archive.execute("SELECT 1 FROM sqlite_master WHERE name = 'articles_fts'").fetchone() is None:
+                continue  # Written before archives were indexed, until retention.py next runs
+            for result in search_database(archive, match, source, since, until, after, limit + 1):
+                # An article copied but not yet deleted by an interrupted run is in both
+                found.setdefault(result['id'], result)
+        finally:
+            archive.close()
+
+    rows = sorted(found.values(), key=lambda result: (result['score'], result['id']))
+    results = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = results[-1]
+        next_cursor = encode_cursor(last['score'], last['id'])
+    return results, next_cursor
+
+def date_argument(text):
+    """Parses a --since/--until value (YYYY-MM-DD, or any ISO 8601 / RFC 822 date) to epoch seconds."""
+    timestamp = dates.parse_timestamp(text)
+    if timestamp is None:
+        raise argparse.ArgumentTypeError(f'not a date: {text!r}')
+    return timestamp
+
+def main():
+    parser = argparse.ArgumentParser(description='Search the stored crypto news articles.')
+    parser.add_argument('query', help='words to search for (all must match, word* for a prefix)')
+    parser.add_argument('--source', help='only articles from this source, e.g. "Coindesk"')
+    parser.add_argument('--since', type=date_argument, help='only articles published on or after this date (YYYY-MM-DD, UTC)')
+    parser.add_argument('--until', type=date_argument, help='only articles published before this date (YYYY-MM-DD, UTC)')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT, help='results per page')
+    parser.add_argument('--cursor', help='cursor printed by the previous page')
+    parser.add_argument('--raw', action='store_true', help='pass the query to FTS5 unchanged (AND/OR/NEAR, column filters)')
+    args = parser.parse_args()
+
+    storage.setup_database()
+    conn = storage.connect()
+    try:
+        results, next_cursor = search(conn, args.query, args.source, args.since, args.until,
+                                      args.limit, args.cursor, args.raw)
+    except sqlite3.OperationalError as error:
+        parser.exit(2, f"Invalid search query: {error}\n")
+    except ValueError:
+        parser.exit(2, f"Invalid cursor: {args.cursor!r}\n")
+    finally:
+        conn.close()
+
+    if not results:
+        print("No matching articles.")
+        return
+    for article in results:
+        print(f"{article['publication_date']}  [{article['source']}]  {article['title']}")
+        print(f"    {article['link']}")
+        if article['excerpt']:
+            print(f"    {article['excerpt']}")
+    if next_cursor:
+        print(f"\nMore results: --cursor '{next_cursor}'")
+
+if __name__ == '__main__':
+    main()
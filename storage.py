@@ -0,0 +1,366 @@
+import json
+import sqlite3
+
+# ------------------------------
+# Database Settings
+# ------------------------------
+DATABASE_PATH = 'central_rss_articles.db'
+BUSY_TIMEOUT_SECONDS = 30  # How long a connection waits on a lock before failing
+GENERATION_STATE_NAME = 'articles_generation'  # Bumped by every commit that adds or removes articles
+
+# ------------------------------
+# Schema Migrations
+# ------------------------------
+# Migrations run once each, in order. PRAGMA user_version stores how many have been applied,
+# so new schema changes are appended here and never edited once released.
+def add_article_tags(conn):
+    """Creates the coin tag index and tags the articles already stored."""
+    import tagging  # tagging imports this module
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS article_tags (
+            article_id INTEGER NOT NULL,
+            coin TEXT NOT NULL,
+            published_at INTEGER,
+            PRIMARY KEY (article_id, coin)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_article_tags_coin ON article_tags (coin, published_at, article_id)')
+    tagging.tag_stored(conn)
+
+def retag_articles(conn):
+    """Tags the stored articles again, after ambiguous coin names were limited to capitalized mentions."""
+    import tagging  # tagging imports this module
+    conn.execute('DELETE FROM article_tags')
+    tagging.tag_stored(conn)
+
+def switch_to_minhash(conn):
+    """Replaces the SimHash story index with word sets and MinHash bands (filled by rebuild_minhash_bands).
+
+    Existing story_ids are kept; only new articles are clustered with the new index.
+    """
+    conn.execute('DROP TABLE IF EXISTS simhash_bands')
+    conn.execute('DROP TABLE IF EXISTS article_fingerprints')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS article_words (
+            link TEXT PRIMARY KEY,
+            words TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS minhash_bands (
+            band INTEGER NOT NULL,
+            value INTEGER NOT NULL,
+            link TEXT NOT NULL,
+            PRIMARY KEY (band, value, link)
+        ) WITHOUT ROWID
+    ''')
+
+def rebuild_minhash_bands(conn):
+    """Keys the LSH bands by article id and publication time and indexes the stored articles again.
+
+    The primary key lets a lookup read only the bands inside the story window.
+    """
+    import dedupe  # dedupe is only needed by this migration
+    conn.execute('DROP TABLE IF EXISTS minhash_bands')
+    conn.execute('''
+        CREATE TABLE minhash_bands (
+            band INTEGER NOT NULL,
+            value INTEGER NOT NULL,
+            published_at INTEGER NOT NULL,
+            article_id INTEGER NOT NULL,
+            PRIMARY KEY (band, value, published_at, article_id)
+        ) WITHOUT ROWID
+    ''')
+    dedupe.index_stored(conn)
+
+MIGRATIONS = [
+    # 1: articles and the per-feed HTTP validator cache
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS articles (
+            title TEXT,
+            link TEXT PRIMARY KEY,
+            description TEXT,
+            publication_date TEXT,
+            content_url TEXT,
+            sent_to_discord BOOLEAN DEFAULT 0,
+            source TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS feed_cache (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT
+        )
+        ''',
+    ],
+    # 2: indexes for the unsent-articles export and the newest-first listing
+    [
+        'CREATE INDEX IF NOT EXISTS idx_articles_unsent ON articles (publication_date) WHERE sent_to_discord = 0',
+        'CREATE INDEX IF NOT EXISTS idx_articles_publication_date ON articles (publication_date)',
+    ],
+    # 3: per-source high-water mark of the newest ingested article
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS feed_state (
+            source TEXT PRIMARY KEY,
+            last_publication_date TEXT,
+            last_link TEXT
+        )
+        ''',
+    ],
+    # 4: near-duplicate story clusters (SimHash fingerprints with an LSH band index)
+    [
+        'ALTER TABLE articles ADD COLUMN story_id TEXT',
+        'CREATE INDEX IF NOT EXISTS idx_articles_story ON articles (story_id)',
+        '''
+        CREATE TABLE IF NOT EXISTS article_fingerprints (
+            link TEXT PRIMARY KEY,
+            simhash INTEGER NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS simhash_bands (
+            band INTEGER NOT NULL,
+            value INTEGER NOT NULL,
+            link TEXT NOT NULL,
+            PRIMARY KEY (band, value, link)
+        ) WITHOUT ROWID
+        ''',
+    ],
+    # 5: stable integer ids for articles (VACUUM may renumber implicit rowids), link stays unique
+    [
+        '''
+        CREATE TABLE articles_new (
+            title TEXT,
+            link TEXT NOT NULL UNIQUE,
+            description TEXT,
+            publication_date TEXT,
+            content_url TEXT,
+            sent_to_discord BOOLEAN DEFAULT 0,
+            source TEXT,
+            story_id TEXT,
+            id INTEGER PRIMARY KEY AUTOINCREMENT
+        )
+        ''',
+        '''
+        INSERT INTO articles_new (title, link, description, publication_date, content_url, sent_to_discord, source, story_id)
+        SELECT title, link, description, publication_date, content_url, sent_to_discord, source, story_id
+        FROM articles ORDER BY rowid
+        ''',
+        'DROP TABLE articles',
+        'ALTER TABLE articles_new RENAME TO articles',
+        'CREATE INDEX idx_articles_unsent ON articles (publication_date) WHERE sent_to_discord = 0',
+        'CREATE INDEX idx_articles_publication_date ON articles (publication_date)',
+        'CREATE INDEX idx_articles_story ON articles (story_id)',
+    ],
+    # 6: full-text index over title, description and source, kept in sync by triggers
+    [
+        '''
+        CREATE VIRTUAL TABLE articles_fts USING fts5(
+            title, description, source,
+            content='articles', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        '''
+        CREATE TRIGGER articles_fts_insert AFTER INSERT ON articles BEGIN
+            INSERT INTO articles_fts (rowid, title, description, source)
+            VALUES (new.id, new.title, new.description, new.source);
+        END
+        ''',
+        '''
+        CREATE TRIGGER articles_fts_delete AFTER DELETE ON articles BEGIN
+            INSERT INTO articles_fts (articles_fts, rowid, title, description, source)
+            VALUES ('delete', old.id, old.title, old.description, old.source);
+        END
+        ''',
+        '''
+        CREATE TRIGGER articles_fts_update AFTER UPDATE OF title, description, source ON articles BEGIN
+            INSERT INTO articles_fts (articles_fts, rowid, title, description, source)
+            VALUES ('delete', old.id, old.title, old.description, old.source);
+            INSERT INTO articles_fts (rowid, title, description, source)
+            VALUES (new.id, new.title, new.description, new.source);
+        END
+        ''',
+        "INSERT INTO articles_fts (articles_fts) VALUES ('rebuild')",
+    ],
+    # 7: small named state values for incremental jobs, and per-source listing
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS pipeline_state (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_articles_source ON articles (source, id)',
+    ],
+    # 8: Discord delivery outbox with per-article claim/ack/retry state
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            article_id INTEGER NOT NULL UNIQUE,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at REAL NOT NULL DEFAULT 0,
+            claimed_by TEXT,
+            sent_at REAL,
+            last_error TEXT
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_outbox_ready ON outbox (status, available_at)',
+    ],
+    # 9: integer UTC publication time for sorting and range queries, backfilled from the text dates
+    [
+        'ALTER TABLE articles ADD COLUMN published_at INTEGER',
+        'ALTER TABLE feed_state ADD COLUMN last_published_at INTEGER',
+        # Stored dates were UTC, except the sources parsed with the old local-time converter;
+        # 'Unknown' and other unparseable text become NULL
+        '''
+        UPDATE articles SET published_at = CAST(strftime('%s', publication_date,
+            CASE WHEN source IN ('The Defiant', 'Bitcoin Magazine') THEN 'utc' ELSE '+0 seconds' END) AS INTEGER)
+        ''',
+        "UPDATE articles SET publication_date = datetime(published_at, 'unixepoch')",
+        '''
+        UPDATE feed_state SET last_published_at = (
+            SELECT published_at FROM articles WHERE articles.link = feed_state.last_link
+        )
+        ''',
+        "UPDATE feed_state SET last_publication_date = datetime(last_published_at, 'unixepoch')",
+        'DROP INDEX IF EXISTS idx_articles_unsent',
+        'DROP INDEX IF EXISTS idx_articles_publication_date',
+        'CREATE INDEX idx_articles_unsent ON articles (published_at) WHERE sent_to_discord = 0',
+        'CREATE INDEX idx_articles_published_at ON articles (published_at)',
+    ],
+    # 10: local image thumbnail cache, files keyed by content hash and URLs pointing at them
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS image_files (
+            digest TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_used REAL NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_image_files_last_used ON image_files (last_used)',
+        '''
+        CREATE TABLE IF NOT EXISTS image_urls (
+            url TEXT PRIMARY KEY,
+            digest TEXT,
+            fetched_at REAL NOT NULL
+        )
+        ''',
+    ],
+    # 11: newest-first listing per source for the read API
+    [
+        'CREATE INDEX IF NOT EXISTS idx_articles_source_published_at ON articles (source, published_at)',
+    ],
+    # 12: one outbox row per article and webhook target, existing rows belong to the default target
+    [
+        '''
+        CREATE TABLE outbox_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            article_id INTEGER NOT NULL,
+            target TEXT NOT NULL DEFAULT 'default',
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at REAL NOT NULL DEFAULT 0,
+            claimed_by TEXT,
+            sent_at REAL,
+            last_error TEXT,
+            UNIQUE (article_id, target)
+        )
+        ''',
+        '''
+        INSERT INTO outbox_new (id, article_id, target, status, attempts, available_at, claimed_by, sent_at, last_error)
+        SELECT id, article_id, 'default', status, attempts, available_at, claimed_by, sent_at, last_error FROM outbox
+        ''',
+        'DROP TABLE outbox',
+        'ALTER TABLE outbox_new RENAME TO outbox',
+        'CREATE INDEX idx_outbox_ready ON outbox (target, status, available_at)',
+    ],
+    # 13: per-feed health for the ingest circuit breaker
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS feed_health (
+            source TEXT PRIMARY KEY,
+            consecutive_failures INTEGER NOT NULL DEFAULT 0,
+            last_success REAL,
+            last_failure REAL,
+            last_error TEXT,
+            open_until REAL NOT NULL DEFAULT 0,
+            latencies TEXT
+        )
+        ''',
+    ],
+    # 14: coins mentioned by each article, with stored articles tagged on the way
+    add_article_tags,
+    # 15: near-duplicate stories found by word-set similarity (MinHash LSH) instead of SimHash
+    switch_to_minhash,
+    # 16: drop tags of ambiguous coin names used as common words ("a ripple effect")
+    retag_articles,
+    # 17: LSH bands looked up within the story window, with more rows per band
+    rebuild_minhash_bands,
+]
+
+def connect(path=DATABASE_PATH, check_same_thread=True):
+    """Opens a connection in WAL mode so readers and the ingester don't block each other."""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=check_same_thread)
+    # Must come before WAL mode to apply to a new database; retention.py converts existing ones
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')  # Safe with WAL, avoids an fsync per commit
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute('PRAGMA cache_size = -16000')  # About 16 MB of page cache
+    return conn
+
+def migrate(conn):
+    """Applies the migrations this database has not seen yet."""
+    while True:
+        # The write lock is taken before reading the version so concurrent processes migrate once
+        conn.execute('BEGIN IMMEDIATE')
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= len(MIGRATIONS):
+            conn.rollback()
+            return
+        try:
+            migration = MIGRATIONS[version]
+            if callable(migration):
+                migration(conn)
+            else:
+                for statement in migration:
+                    conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {version + 1}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+def setup_database(path=DATABASE_PATH):
+    """Creates or upgrades the database schema."""
+    conn = connect(path)
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
+
+# ------------------------------
+# Pipeline State
+# ------------------------------
+def get_state(conn, name, default=None):
+    """Returns the JSON value stored under name, or default."""
+    row = conn.execute('SELECT value FROM pipeline_state WHERE name = ?', (name,)).fetchone()
+    return json.loads(row[0]) if row else default
+
+def set_state(conn, name, value):
+    """Stores a JSON-serializable value under name (committed by the caller)."""
+    conn.execute('INSERT OR REPLACE INTO pipeline_state (name, value) VALUES (?, ?)', (name, json.dumps(value)))
+
+def get_generation(conn):
+    """Returns the articles generation, which readers compare to know whether their caches are stale."""
+    return get_state(conn, GENERATION_STATE_NAME, 0)
+
+def bump_generation(conn):
+    """Increments the articles generation (committed by the caller, with the change it announces)."""
+    set_state(conn, GENERATION_STATE_NAME, get_generation(conn) + 1)
@@ -0,0 +1,88 @@
+import xml.etree.ElementTree as ET
+
+# ------------------------------
+# Incremental RSS/Atom Parsing
+# ------------------------------
+# Entries are produced with the same keys feedparser uses (title, link, description, published,
+# media_content, media_thumbnail, enclosures) so the feed registry extractors work on both.
+ATOM_NS = '{http://www.w3.org/2005/Atom}'
+MEDIA_NS = '{http://search.yahoo.com/mrss/}'
+CONTENT_NS = '{http://purl.org/rss/1.0/modules/content/}'
+
+ENTRY_TAGS = {'item', ATOM_NS + 'entry'}
+CHANNEL_TAGS = {'channel', ATOM_NS + 'feed'}
+
+def element_text(element):
+    """Returns the stripped text of an element."""
+    return (element.text or '').strip()
+
+def add_media(entry, element):
+    """Adds a media:content or media:thumbnail element to the entry."""
+    url = element.get('url')
+    if not url:
+        return
+    if element.tag == MEDIA_NS + 'content':
+        entry['media_content'].append({'url': url, 'type': element.get('type', '')})
+    elif element.tag == MEDIA_NS + 'thumbnail':
+        entry['media_thumbnail'].append({'url': url})
+
+def entry_from_element(element):
+    """Converts an <item> or Atom <entry> element into a feedparser-style entry dict."""
+    entry = {'media_content': [], 'media_thumbnail': [], 'enclosures': []}
+    content = None
+    for child in element:
+        tag = child.tag
+        if tag in ('title', ATOM_NS + 'title'):
+            entry['title'] = element_text(child)
+        elif tag == 'link':
+            entry['link'] = element_text(child)
+        elif tag == ATOM_NS + 'link':
+            if child.get('rel', 'alternate') == 'alternate':
+                entry.setdefault('link', child.get('href'))
+            elif child.get('rel') == 'enclosure':
+                entry['enclosures'].append({'href': child.get('href'), 'type': child.get('type', '')})
+        elif tag in ('description', ATOM_NS + 'summary'):
+            entry.setdefault('description', element_text(child))
+        elif tag in (ATOM_NS + 'content', CONTENT_NS + 'encoded'):
+            if content is None:
+                content = element_text(child)
+        elif tag in ('pubDate', ATOM_NS + 'published', ATOM_NS + 'updated'):
+            entry.setdefault('published', element_text(child))
+        elif tag == 'enclosure':
+            entry['enclosures'].append({'href': child.get('url'), 'type': child.get('type', '')})
+        elif tag in (MEDIA_NS + 'content', MEDIA_NS + 'thumbnail'):
+            add_media(entry, child)
+        elif tag == MEDIA_NS + 'group':
+            for media in child:
+                add_media(entry, media)
+    # The summary wins over the full content wherever it appears, as with feedparser
+    if 'description' not in entry and content is not None:
+        entry['description'] = content
+    return entry
+
+def iter_entries(chunks, feed_info):
+    """Yields entries one at a time from an RSS/Atom document given as an iterable of byte chunks.
+
+    Feed-level metadata seen so far (currently the feed image) is written into feed_info.
+    Stopping the iteration early stops reading the remaining chunks.
+    """
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    parents = []
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            if event == 'start':
+                parents.append(element)
+                continue
+            parents.pop()
+            parent_tag = parents[-1].tag if parents else None
+            if element.tag in ENTRY_TAGS:
+                yield entry_from_element(element)
+                # Drop the parsed entry so memory stays flat on long feeds
+                if parents:
+                    parents[-1].remove(element)
+            elif parent_tag in CHANNEL_TAGS and element.tag in (ATOM_NS + 'logo', ATOM_NS + 'icon'):
+                feed_info.setdefault('image', {'href': element_text(element)})
+            elif parent_tag == 'image' and element.tag == 'url' and len(parents) > 1 and parents[-2].tag in CHANNEL_TAGS:
+                feed_info['image'] = {'href': element_text(element)}
+    parser.close()
@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import re
+from collections import deque
+
+import storage
+
+# ------------------------------
+# Tagging Settings
+# ------------------------------
+COINS_PATH = os.getenv('COINS_PATH', 'coins.json')  # Replaces DEFAULT_COINS when it exists
+RETAG_BATCH_SIZE = 1000  # Articles read at a time when tagging stored articles
+
+# Names match in any case. Proper names that are also common words match only capitalized,
+# so "Avalanche" is AVAX but "an avalanche of liquidations" is not. Tickers match only as
+# written in upper case or with a $ prefix, so "LINK" and "$link" are Chainlink but "link" is not.
+DEFAULT_COINS = {
+    'BTC': {'names': ['bitcoin'], 'tickers': ['BTC', 'XBT']},
+    'ETH': {'names': ['ethereum', 'ether'], 'tickers': ['ETH']},
+    'SOL': {'names': ['solana'], 'tickers': ['SOL']},
+    'XRP': {'names': ['xrp'], 'proper_names': ['ripple'], 'tickers': ['XRP']},
+    'BNB': {'names': ['binance coin', 'bnb chain'], 'tickers': ['BNB']},
+    'ADA': {'names': ['cardano'], 'tickers': ['ADA']},
+    'DOGE': {'names': ['dogecoin'], 'tickers': ['DOGE']},
+    'TRX': {'proper_names': ['tron'], 'tickers': ['TRX']},
+    'TON': {'names': ['toncoin'], 'tickers': ['TON']},
+    'AVAX': {'proper_names': ['avalanche'], 'tickers': ['AVAX']},
+    'DOT': {'names': ['polkadot'], 'tickers': ['DOT']},
+    'LINK': {'names': ['chainlink'], 'tickers': ['LINK']},
+    'MATIC': {'proper_names': ['polygon'], 'tickers': ['MATIC', 'POL']},
+    'LTC': {'names': ['litecoin'], 'tickers': ['LTC']},
+    'BCH': {'names': ['bitcoin cash'], 'tickers': ['BCH']},
+    'SHIB': {'names': ['shiba inu'], 'tickers': ['SHIB']},
+    'XMR': {'names': ['monero'], 'tickers': ['XMR']},
+    'ARB': {'names': ['arbitrum'], 'tickers': ['ARB']},
+    'USDT': {'names': ['tether'], 'tickers': ['USDT']},
+    'USDC': {'names': ['usd coin'], 'tickers': ['USDC']},
+}
+
+# ------------------------------
+# Automaton
+# ------------------------------
+class CoinMatcher:
+    """Aho-Corasick automaton over every coin name and ticker.
+
+    An article is scanned once, whatever the size of the dictionary. Matches must be whole
+    words, and where two overlap the longer one wins ("bitcoin cash" is BCH, not BTC).
+    """
+
+    def __init__(self, coins):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]  # (pattern length, coin, case rule) of the patterns ending at each state
+        for coin, aliases in coins.items():
+            for name in aliases.get('names', []):
+                self.add(name.lower(), coin, None)
+            for name in aliases.get('proper_names', []):
+                self.add(name.lower(), coin, 'capitalized')
+            for ticker in aliases.get('tickers', []):
+                self.add(ticker.lower(), coin, 'upper')
+                self.add('$' + ticker.lower(), coin, None)
+        self.build()
+
+    def add(self, pattern, coin, case):
+        """Adds a lowercase pattern to the trie; build() must run afterwards."""
+        state = 0
+        for char in pattern:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.output[state].append((len(pattern), coin, case))
+
+    def build(self):
+        """Computes the failure links breadth first."""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0) if state else 0
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def coins(self, text):
+        """Returns the set of coins mentioned in text."""
+        lowered = text.lower()
+        if len(lowered) != len(text):  # A few characters change length when lowered; keep offsets aligned
+            lowered = ''.join(char.lower() if len(char.lower()) == 1 else char for char in text)
+        matches = []
+        state = 0
+        for end, char in enumerate(lowered, 1):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for length, coin, case in self.output[state]:
+                start = end - length
+                if start > 0 and is_word_char(text[start - 1]) or end < len(text) and is_word_char(text[end]):
+                    continue
+                if case == 'upper' and not text[start:end].isupper():
+                    continue
+                if case == 'capitalized' and not text[start].isupper():
+                    continue
+                matches.append((start, end, coin))
+
+        found = set()
+        covered = -1
+        for start, end, coin in sorted(matches, key=lambda match: (match[0], -match[1])):
+            if start >= covered:
+                found.add(coin)
+                covered = end
+        return found
+
+def is_word_char(char):
+    """Tells whether a character continues a word, so a match next to it is not a whole word."""
+    return char.isalnum() or char == '_'
+
+def load_coins(path=COINS_PATH):
+    """Reads the coin dictionary ({"ETH": {"names": [...], "proper_names": [...], "tickers": [...]}}), or DEFAULT_COINS."""
+    if not os.path.exists(path):
+        return DEFAULT_COINS
+    with open(path) as file:
+        return json.load(file)
+
+_matcher = None
+
+def get_matcher():
+    """Returns the automaton for the configured dictionary, built on first use."""
+    global _matcher
+    if _matcher is None:
+        _matcher = CoinMatcher(load_coins())
+    return _matcher
+
+# ------------------------------
+# Article Tags
+# ------------------------------
+def article_text(title, description):
+    """Returns the text of an article that is searched for coins, without markup."""
+    return re.sub('<[^>]*>', ' ', f"{title or ''}\n{description or ''}")
+
+def tag_articles(conn, rows):
+    """Stores the coins mentioned in newly stored articles in article_tags (an ingest article stage)."""
+    matcher = get_matcher()
+    tags = []
+    for row in rows:
+        for coin in matcher.coins(article_text(row['title'], row['description'])):
+            tags.append((coin, row['published_at'], row['link']))
+    conn.executemany('''
+        INSERT OR IGNORE INTO article_tags (article_id, coin, published_at)
+        SELECT id, ?, ? FROM articles WHERE link = ?
+    ''', tags)
+
+def tag_stored(conn):
+    """Tags every stored article, a batch at a time (committed by the caller); returns how many tags were stored."""
+    matcher = get_matcher()
+    cursor = conn.execute('SELECT id, title, description, published_at FROM articles ORDER BY id')
+    tagged = 0
+    while True:
+        rows = cursor.fetchmany(RETAG_BATCH_SIZE)
+        if not rows:
+            return tagged
+        tags = [(article_id, coin, published_at)
+                for article_id, title, description, published_at in rows
+                for coin in matcher.coins(article_text(title, description))]
+        conn.executemany('INSERT OR IGNORE INTO article_tags (article_id, coin, published_at) VALUES (?, ?, ?)',
+                         tags)
+        tagged += len(tags)
+
+def retag_all(conn):
+    """Rebuilds article_tags for every stored article in one transaction, e.g. after the coin dictionary changed."""
+    with conn:
+        conn.execute('DELETE FROM article_tags')
+        tagged = tag_stored(conn)
+        storage.bump_generation(conn)
+    return tagged
+
+def articles_for_coin(conn, coin, before=None, limit=50):
+    """Lists a coin's articles newest first, read from the article_tags index.
+
+    before is a (published_at, id) keyset cursor. Articles whose date could not be read are not listed.
+    """
+    sql = '''
+        SELECT a.id, a.title, a.link, a.description, a.publication_date, a.published_at, a.content_url,
+               a.source, a.story_id
+        FROM article_tags t JOIN articles a ON a.id = t.article_id
+        WHERE t.coin = ? AND t.published_at IS NOT NULL
+    '''
+    args = [coin.upper()]
+    if before is not None:
+        sql += ' AND (t.published_at, t.article_id) < (?, ?)'
+        args.extend(before)
+    sql += ' ORDER BY t.published_at DESC, t.article_id DESC LIMIT ?'
+    args.append(limit)
+    cursor = conn.execute(sql, args)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def coin_counts(conn):
+    """Returns (coin, article count) pairs, most mentioned first."""
+    return conn.execute('SELECT coin, COUNT(*) FROM article_tags GROUP BY coin ORDER BY COUNT(*) DESC, coin').fetchall()
+
+def main():
+    parser = argparse.ArgumentParser(description='Coin tags of the stored articles.')
+    parser.add_argument('coin', nargs='?', help='list the newest articles about this coin, e.g. ETH')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--retag', action='store_true', help='re-tag every stored article')
+    args = parser.parse_args()
+
+    storage.setup_database()
+    conn = storage.connect()
+    try:
+        if args.retag:
+            print(f"{retag_all(conn)} tags stored.")
+        if args.coin:
+            for article in articles_for_coin(conn, args.coin, limit=args.limit):
+                print(f"{article['publication_date']}  {article['source']:<18} {article['title']}")
+        elif not args.retag:
+            for coin, count in coin_counts(conn):
+                print(f"{coin:<8} {count}")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
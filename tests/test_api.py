@@ -0,0 +1,96 @@
+import gzip
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+import api
+import generate_feeds
+import storage
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage.setup_database()
+    conn = storage.connect(check_same_thread=False)
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def base_url(conn, monkeypatch):
+    monkeypatch.setattr(api.ApiHandler, 'conn', conn)
+    monkeypatch.setattr(api.ApiHandler, 'cache', api.ResponseCache(api.API_CACHE_SIZE))
+    server = ThreadingHTTPServer(('127.0.0.1', 0), api.ApiHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+def test_feed_encodings_have_their_own_etags(base_url):
+    generate_feeds.write_feed(generate_feeds.feed_path('all', 'rss'), '<rss></rss>\n')
+    plain = requests.get(f'{base_url}/feeds/all.rss', headers={'Accept-Encoding': 'identity'})
+    gzipped = requests.get(f'{base_url}/feeds/all.rss', headers={'Accept-Encoding': 'gzip'}, stream=True)
+    assert plain.content == gzip.decompress(gzipped.raw.read()) == b'<rss></rss>\n'
+    assert plain.headers['ETag'] != gzipped.headers['ETag']
+
+    # A validator only revalidates the encoding it was issued for
+    revalidated = requests.get(f'{base_url}/feeds/all.rss',
+                               headers={'Accept-Encoding': 'gzip', 'If-None-Match': plain.headers['ETag']})
+    assert revalidated.status_code == 200
+    revalidated = requests.get(f'{base_url}/feeds/all.rss',
+                               headers={'Accept-Encoding': 'gzip', 'If-None-Match': gzipped.headers['ETag']})
+    assert revalidated.status_code == 304
+
+def add_articles(conn, count, start=0):
+    with conn:
+        # Several articles share each publication time, so the cursor has to break ties by id
+        conn.executemany('''
+            INSERT INTO articles (title, link, description, publication_date, published_at, content_url, source)
+            VALUES (?, ?, '', '', ?, 'No Image', 'Coindesk')
+        ''', [(f'Headline {i}', f'https://example.com/{i}', 1_750_000_000 + i // 3) for i in range(start, start + count)])
+        storage.bump_generation(conn)
+
+def test_cursor_walk_returns_every_article_once(conn, base_url):
+    add_articles(conn, 57)
+    seen = []
+    cursor = None
+    while True:
+        page = requests.get(f'{base_url}/articles', params={'limit': 10, 'cursor': cursor}).json()
+        seen.extend(article['id'] for article in page['articles'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert sorted(seen) == list(range(1, 58))
+    assert len(seen) == 57
+
+def test_cache_is_cleared_when_another_connection_adds_articles(conn, base_url):
+    add_articles(conn, 3)
+    assert len(requests.get(f'{base_url}/articles').json()['articles']) == 3
+
+    writer = storage.connect()
+    try:
+        # A commit that does not touch articles keeps the cached response
+        with writer:
+            storage.set_state(writer, 'unrelated', 1)
+        assert len(requests.get(f'{base_url}/articles').json()['articles']) == 3
+        add_articles(writer, 2, start=3)
+    finally:
+        writer.close()
+    assert len(requests.get(f'{base_url}/articles').json()['articles']) == 5
+
+def test_if_none_match_returns_304(conn, base_url):
+    add_articles(conn, 3)
+    first = requests.get(f'{base_url}/articles')
+    etag = first.headers['ETag']
+    revalidated = requests.get(f'{base_url}/articles', headers={'If-None-Match': etag})
+    assert (revalidated.status_code, revalidated.content, revalidated.headers['ETag']) == (304, b'', etag)
+
+    writer = storage.connect()
+    try:
+        add_articles(writer, 1, start=3)
+    finally:
+        writer.close()
+    changed = requests.get(f'{base_url}/articles', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
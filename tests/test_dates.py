@@ -0,0 +1,40 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import pytest
+
+import dates
+
+@pytest.mark.parametrize('text', [
+    'Fri, 12 Jan 2024 13:47:21 +0000',
+    'Tue, 12 Dec 2023 14:27:00 GMT',
+    'Mon, 01 Jul 2024 09:05:00 -0400',
+    'Thu, 29 Feb 2024 23:59:59 +0530',
+    'Sun, 3 Mar 2024 08:00:00 EST',
+    'Wed, 31 Dec 2025 22:00:00 PDT',
+    '1 Jan 2025 00:00:00 +0100',
+    'Sat, 12 Oct 24 10:11:12 UT',
+])
+def test_rfc822_matches_email_utils(text):
+    assert dates.parse_timestamp(text) == int(parsedate_to_datetime(text).timestamp())
+
+@pytest.mark.parametrize('text', [
+    '2024-01-12T13:47:21Z',
+    '2024-01-12T13:47:21+02:00',
+    '2024-01-12T13:47:21.123-05:30',
+    '2024-01-12 13:47:21',
+    '2024-02-29',
+])
+def test_iso8601_matches_datetime(text):
+    expected = datetime.fromisoformat(text)
+    if expected.tzinfo is None:  # Dates without a zone are UTC
+        expected = expected.replace(tzinfo=timezone.utc)
+    assert dates.parse_timestamp(text) == int(expected.timestamp())
+
+@pytest.mark.parametrize('text', ['', 'Unknown', 'Fri, 30 Feb 2024 10:00:00 GMT', '2023-02-29T00:00:00Z',
+                                  'Fri, 12 Foo 2024 13:47:21 +0000', 'Fri, 12 Jan 2024 13:47:21 XYZ'])
+def test_invalid_dates(text):
+    assert dates.parse_timestamp(text) is None
+
+def test_format_timestamp_is_utc():
+    assert dates.format_timestamp(dates.parse_timestamp('Fri, 12 Jan 2024 13:47:21 -0500')) == '2024-01-12 18:47:21'
@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+import dedupe
+import main
+import storage
+
+# Headlines of the same story as worded by different outlets
+SAME_STORY = [
+    ('U.S. SEC approves spot Bitcoin ETFs for trading', 'US SEC approves spot bitcoin ETFs to trade'),
+    ('SEC Approves First Spot Bitcoin ETFs in Landmark Decision',
+     'SEC approves first spot bitcoin ETFs in landmark ruling'),
+    ('Ethereum completes Dencun upgrade, cutting layer-2 fees',
+     "Ethereum's Dencun upgrade goes live, slashing layer-2 fees"),
+    ('Bitcoin price tops $70,000 for first time', 'Bitcoin tops $70,000 for the first time ever'),
+    ('FTX founder Sam Bankman-Fried sentenced to 25 years in prison',
+     'Sam Bankman-Fried sentenced to 25 years in prison'),
+    ('Binance CEO Changpeng Zhao steps down, pleads guilty',
+     "Binance's Changpeng Zhao pleads guilty and steps down as CEO"),
+    ('Solana network suffers five-hour outage', 'Solana network suffers 5-hour outage'),
+    ('Bitcoin halving completed, block reward drops to 3.125 BTC',
+     'Bitcoin halving is complete as block reward falls to 3.125 BTC'),
+    ('BlackRock files for spot Ethereum ETF', 'BlackRock files to launch a spot Ether ETF'),
+    ('Tether mints another $1 billion USDT on Tron', 'Tether mints $1B USDT on Tron network'),
+]
+
+DIFFERENT_STORIES = [
+    ('Bitcoin price drops below $65,000', 'Bitcoin price rises above $65,000'),
+    ('SEC delays decision on spot Ethereum ETFs', 'SEC Approves First Spot Bitcoin ETFs in Landmark Decision'),
+    ('Bitcoin ETF inflows hit record high', 'Spot bitcoin ETFs see record outflows'),
+    ('Bitcoin miners sell record amount of BTC ahead of halving', 'Bitcoin halving completed, block reward drops'),
+]
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / 'articles.db')
+    storage.setup_database(path)
+    conn = storage.connect(path)
+    yield conn
+    conn.close()
+
+def store(conn, title, link, published_at=1700000000, description=''):
+    """Stores one article through the ingest path and returns its story_id."""
+    row = {'title': title, 'link': link, 'description': description, 'publication_date': None,
+           'published_at': published_at, 'content_url': 'No Image', 'source': link.split('/')[2]}
+    main.store_articles(conn, [row])
+    return conn.execute('SELECT story_id FROM articles WHERE link = ?', (link,)).fetchone()[0]
+
+@pytest.mark.parametrize('first, second', SAME_STORY)
+def test_reworded_headlines_share_a_story(conn, first, second):
+    first_story = store(conn, first, 'https://coindesk.com/a')
+    assert store(conn, second, 'https://decrypt.co/b', 1700003600) == first_story == 'https://coindesk.com/a'
+
+@pytest.mark.parametrize('first, second', DIFFERENT_STORIES)
+def test_different_stories_stay_apart(conn, first, second):
+    store(conn, first, 'https://coindesk.com/a')
+    assert store(conn, second, 'https://decrypt.co/b') == 'https://decrypt.co/b'
+
+def test_same_headline_days_apart_is_a_new_story(conn):
+    store(conn, 'Bitcoin price tops $70,000', 'https://coindesk.com/a')
+    later = 1700000000 + dedupe.STORY_WINDOW_SECONDS + 1
+    assert store(conn, 'Bitcoin price tops $70,000', 'https://decrypt.co/b', later) == 'https://decrypt.co/b'
+
+def test_short_titles_use_the_description():
+    assert dedupe.story_words('Breaking', '<p>SEC approves spot bitcoin ETFs</p>') >= {'sec', 'spot', 'bitcoin', 'etf'}
+
+# Vocabulary of synthetic headlines: a few words most headlines share, and a long tail
+COMMON_WORDS = ['bitcoin', 'price', 'btc', 'ethereum', 'market', 'crypto', 'etf', 'sec', 'trader', 'whale',
+                'rally', 'drop', 'record', 'high', 'billion', 'exchange', 'token', 'solana', 'analyst', 'fund']
+RARE_WORDS = [f'word{i}' for i in range(3000)]
+ARTICLES_PER_DAY = 100
+DAY = 86400
+
+def add_synthetic_days(conn, rng, first_day, last_day):
+    """Stores ARTICLES_PER_DAY synthetic headlines for each day in the range, indexed like ingested ones."""
+    rows = []
+    for day in range(first_day, last_day + 1):
+        for i in range(ARTICLES_PER_DAY):
+            words = rng.sample(COMMON_WORDS, rng.randint(1, 4))
+            words += rng.sample(RARE_WORDS, rng.randint(4, 7))
+            rows.append((' '.join(words), f'https://example.com/{day}/{i}', 1700000000 + day * DAY + i * 60))
+    with conn:
+        conn.executemany("INSERT INTO articles (title, link, published_at, source) VALUES (?, ?, ?, 'Example')", rows)
+        for title, link, published_at in rows:
+            dedupe.index_article(conn, link, dedupe.story_words(title, None), published_at)
+
+def test_candidates_stay_bounded_as_the_archive_grows(conn):
+    rng = random.Random(7)
+    add_synthetic_days(conn, rng, -3, 0)
+    queries = [dedupe.story_words(' '.join(rng.sample(COMMON_WORDS, 3) + rng.sample(RARE_WORDS, 5)), None)
+               for _ in range(50)]
+
+    def candidate_count():
+        return sum(len(dedupe.find_candidates(conn, words, 1700000000)) for words in queries)
+
+    recent = candidate_count()
+    # Headlines that only share common words rarely share a band
+    assert recent < 0.02 * len(queries) * 4 * ARTICLES_PER_DAY
+    # Older articles are outside the story window and are never read
+    add_synthetic_days(conn, rng, -20, -4)
+    assert candidate_count() == recent
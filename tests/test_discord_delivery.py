@@ -0,0 +1,72 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import discord_delivery
+
+class ScriptedWebhook(BaseHTTPRequestHandler):
+    """Stands in for a Discord webhook, answering each request with the next scripted response."""
+    responses = []
+    received = []  # (monotonic time, embeds) of every request
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.received.append((time.monotonic(), body['embeds']))
+        status, headers, payload = self.responses.pop(0) if self.responses else (204, {}, None)
+        data = json.dumps(payload).encode() if payload is not None else b''
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def client():
+    ScriptedWebhook.responses = []
+    ScriptedWebhook.received = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ScriptedWebhook)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = discord_delivery.WebhookClient(f'http://127.0.0.1:{server.server_port}/webhook')
+    yield client
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+def embed(description=''):
+    return {'title': 'Headline', 'description': description}
+
+def test_messages_hold_at_most_ten_embeds():
+    messages = list(discord_delivery.pack_embeds((i, embed()) for i in range(25)))
+    assert [len(message) for message in messages] == [10, 10, 5]
+    assert [item for message in messages for item, _ in message] == list(range(25))
+
+def test_messages_stay_within_the_character_limit():
+    messages = list(discord_delivery.pack_embeds((i, embed('x' * 2500)) for i in range(5)))
+    assert [len(message) for message in messages] == [2, 2, 1]
+    assert all(sum(discord_delivery.embed_size(e) for _, e in message) <= 6000 for message in messages)
+
+def test_empty_bucket_waits_for_reset_after(client):
+    ScriptedWebhook.responses = [(204, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-After': '0.3'}, None)]
+    assert client.send([embed()])
+    assert client.send([embed()])
+    (first, _), (second, _) = ScriptedWebhook.received
+    assert second - first >= 0.3
+
+def test_429_waits_for_retry_after(client):
+    ScriptedWebhook.responses = [(429, {}, {'message': 'You are being rate limited.', 'retry_after': 0.3})]
+    assert client.send([embed()])
+    (first, _), (second, _) = ScriptedWebhook.received
+    assert second - first >= 0.3
+
+def test_client_error_is_not_retried(client):
+    ScriptedWebhook.responses = [(400, {}, {'message': 'Invalid Form Body'})]
+    assert not client.send([embed()])
+    assert len(ScriptedWebhook.received) == 1
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+import article_export
+import storage
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage.setup_database()
+    conn = storage.connect()
+    yield conn
+    conn.close()
+
+def add_articles(conn, count):
+    with conn:
+        conn.executemany('''
+            INSERT INTO articles (title, link, description, publication_date, published_at, content_url, source)
+            VALUES (?, ?, '', '', 1750000000, 'No Image', 'Coindesk')
+        ''', [(f'Headline {i}', f'https://example.com/{i}') for i in range(count)])
+
+def test_full_export_does_not_replace_an_incremental_file(conn):
+    add_articles(conn, 3)
+    incremental, count = article_export.export_articles(conn)
+    assert (os.path.basename(incremental), count) == ('articles-default-1.ndjson', 3)
+    full, count = article_export.export_articles(conn, full=True)
+    assert (os.path.basename(full), count) == ('articles-default-full-3.ndjson', 3)
+    assert os.path.exists(incremental)
+    assert article_export.get_cursor(conn, 'default') == 3
@@ -0,0 +1,93 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import feed_health
+import main
+import storage
+
+NOW = 1_750_000_000
+
+def fail(record, now, times=1):
+    for _ in range(times):
+        feed_health.record_failure(record, 0.1, 'HTTP 503', now)
+
+def test_circuit_opens_after_the_threshold():
+    record = feed_health.new_health()
+    fail(record, NOW, feed_health.FAILURE_THRESHOLD - 1)
+    assert feed_health.state(record, NOW) == 'closed'
+    fail(record, NOW)
+    assert feed_health.state(record, NOW) == 'open'
+    assert not feed_health.is_available(record, NOW)
+    assert record['open_until'] == NOW + feed_health.BASE_BACKOFF_SECONDS
+
+def test_open_circuit_becomes_half_open_and_closes_on_success():
+    record = feed_health.new_health()
+    fail(record, NOW, feed_health.FAILURE_THRESHOLD)
+    probe_at = NOW + feed_health.BASE_BACKOFF_SECONDS
+    assert feed_health.state(record, probe_at) == 'half-open'
+    assert feed_health.is_available(record, probe_at)
+    feed_health.record_success(record, 0.1, probe_at)
+    assert feed_health.state(record, probe_at) == 'closed'
+    assert record['consecutive_failures'] == 0
+
+def test_failed_probes_double_the_backoff_up_to_the_cap():
+    record = feed_health.new_health()
+    fail(record, NOW, feed_health.FAILURE_THRESHOLD)
+    now = NOW
+    backoffs = []
+    for _ in range(8):
+        backoffs.append(record['open_until'] - now)
+        now = record['open_until']
+        assert feed_health.state(record, now) == 'half-open'
+        fail(record, now)
+    backoffs.append(record['open_until'] - now)
+    assert backoffs[:7] == [300, 600, 1200, 2400, 4800, 9600, 19200]
+    assert backoffs[7:] == [feed_health.MAX_BACKOFF_SECONDS] * 2
+
+class FeedServer(BaseHTTPRequestHandler):
+    """Serves one working feed at /good and fails every other path."""
+
+    def do_GET(self):
+        if self.path != '/good':
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = ('<rss><channel><title>Good</title><item><title>Bitcoin tops $70,000</title>'
+                '<link>https://good.example/1</link><description>Summary</description>'
+                '<pubDate>Fri, 12 Jan 2024 13:47:21 +0000</pubDate></item></channel></rss>').encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def feed_base(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage.setup_database()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FeedServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+def test_failing_feed_does_not_stop_the_others(feed_base):
+    template = main.FEEDS[0]
+    feeds = [dict(template, source='Good', url=f'{feed_base}/good'),
+             dict(template, source='Broken', url=f'{feed_base}/broken')]
+    new_rows = main.ingest(feeds)
+    assert [row['link'] for row in new_rows] == ['https://good.example/1']
+
+    conn = storage.connect()
+    try:
+        assert conn.execute('SELECT source FROM articles').fetchall() == [('Good',)]
+        health = feed_health.load_health(conn)
+    finally:
+        conn.close()
+    assert health['Good']['consecutive_failures'] == 0
+    assert health['Broken']['consecutive_failures'] == 1
+    assert health['Broken']['last_error'].startswith('503')
@@ -0,0 +1,43 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import main
+
+class TricklingHandler(BaseHTTPRequestHandler):
+    """Sends a feed one byte at a time, each well within the socket timeout."""
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/rss+xml')
+        self.end_headers()
+        try:
+            for _ in range(100):
+                self.wfile.write(b' ')
+                self.wfile.flush()
+                time.sleep(0.05)
+        except OSError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def trickling_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TricklingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/feed'
+    server.shutdown()
+    server.server_close()
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_trickling_feed_stops_at_the_deadline(trickling_url, monkeypatch, streaming):
+    monkeypatch.setattr(main, 'FEED_DEADLINE_SECONDS', 0.5)
+    feed_config = {**main.FEEDS[0], 'url': trickling_url, 'streaming': streaming}
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        main.fetch_and_normalize(feed_config)
+    assert time.monotonic() - started < 2
@@ -0,0 +1,66 @@
+import sqlite3
+import time
+
+import pytest
+
+import search
+import storage
+
+# The articles table as created by the first version of main.py, before schema versions existed
+BASELINE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS articles (
+        title TEXT,
+        link TEXT PRIMARY KEY,
+        description TEXT,
+        publication_date TEXT,
+        content_url TEXT,
+        sent_to_discord BOOLEAN DEFAULT 0,
+        source TEXT
+    )
+'''
+BASELINE_ROWS = [
+    ('Bitcoin ETF sees record inflows', 'https://coindesk.example/1', '<p>Spot funds</p>', '2024-01-12 13:47:21',
+     'https://img.example/1.jpg', 1, 'Coindesk'),
+    ('Ethereum upgrade goes live', 'https://defiant.example/2', 'Dencun', '2024-03-13 15:55:00', 'No Image', 0,
+     'The Defiant'),
+    ('Market wrap', 'https://defiant.example/3', '', 'Unknown', 'No Image', 0, 'The Defiant'),
+]
+
+@pytest.fixture
+def baseline_path(tmp_path, monkeypatch):
+    # The Defiant's dates were stored in the server's local time; run as if it was UTC+2
+    monkeypatch.setenv('TZ', 'Etc/GMT-2')
+    time.tzset()
+    path = str(tmp_path / 'crypto_news.db')
+    conn = sqlite3.connect(path)
+    conn.execute(BASELINE_SCHEMA)
+    conn.executemany('INSERT INTO articles VALUES (?, ?, ?, ?, ?, ?, ?)', BASELINE_ROWS)
+    conn.commit()
+    conn.close()
+    monkeypatch.chdir(tmp_path)
+    yield path
+    monkeypatch.delenv('TZ')
+    time.tzset()
+
+def test_baseline_database_is_upgraded(baseline_path):
+    storage.setup_database(baseline_path)
+    conn = storage.connect(baseline_path)
+    try:
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == len(storage.MIGRATIONS)
+        rows = conn.execute('''
+            SELECT id, link, publication_date, published_at, sent_to_discord, story_id FROM articles ORDER BY id
+        ''').fetchall()
+        assert rows == [
+            (1, 'https://coindesk.example/1', '2024-01-12 13:47:21', 1705067241, 1, None),
+            (2, 'https://defiant.example/2', '2024-03-13 13:55:00', 1710338100, 0, None),
+            (3, 'https://defiant.example/3', None, None, 0, None),
+        ]
+        assert set(conn.execute('SELECT article_id, coin FROM article_tags').fetchall()) == {(1, 'BTC'), (2, 'ETH')}
+        assert conn.execute('SELECT COUNT(*) FROM article_words').fetchone()[0] == 3
+        assert [result['id'] for result in search.search(conn, 'dencun')[0]] == [2]
+
+        # Running the migrations again changes nothing
+        storage.setup_database(baseline_path)
+        assert conn.execute('SELECT COUNT(*) FROM article_tags').fetchone()[0] == 2
+    finally:
+        conn.close()
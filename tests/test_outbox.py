@@ -0,0 +1,57 @@
+import pytest
+
+import generate_discord_notifications
+import outbox
+import storage
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage.setup_database()
+    conn = storage.connect()
+    with conn:
+        conn.executemany('''
+            INSERT INTO articles (title, link, description, publication_date, published_at, content_url, source)
+            VALUES (?, ?, '', '', ?, 'No Image', 'Coindesk')
+        ''', [(f'Headline {i}', f'https://example.com/{i}', 1_750_000_000 + i) for i in range(25)])
+        conn.execute("INSERT INTO outbox (article_id, target) SELECT id, 'default' FROM articles")
+    yield conn
+    conn.close()
+
+def expire_leases(conn):
+    with conn:
+        conn.execute("UPDATE outbox SET available_at = 0 WHERE status = 'claimed'")
+
+class SlowClient:
+    """Lets another sender reclaim the batch while the first message is being delivered."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.sent = []
+
+    def send(self, embeds):
+        if not self.sent:
+            expire_leases(self.conn)
+            outbox.claim_batch(self.conn, 'other-sender', 50)
+        self.sent.append(len(embeds))
+        return True
+
+def test_items_reclaimed_during_a_batch_are_not_sent_twice(conn):
+    client = SlowClient(conn)
+    # Only the first message goes out; the other sender now holds the rest of the batch
+    assert generate_discord_notifications.send_messages_from_outbox(conn, client) == 10
+    assert client.sent == [10]
+
+def test_renewed_lease_keeps_items(conn):
+    items = outbox.claim_batch(conn, 'sender', 50)
+    ids = [item['outbox_id'] for item in items]
+    expire_leases(conn)
+    assert outbox.renew(conn, ids, 'sender') == set(ids)
+    assert outbox.claim_batch(conn, 'other-sender', 50) == []
+
+def test_expired_lease_after_last_attempt_fails_the_item(conn):
+    for _ in range(outbox.MAX_ATTEMPTS):
+        assert len(outbox.claim_batch(conn, 'crashing-sender', 50)) == 25
+        expire_leases(conn)
+    assert outbox.claim_batch(conn, 'sender', 50) == []
+    assert conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'failed'").fetchone()[0] == 25
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+import generate_html_page
+import retention
+import search
+import storage
+
+NOW = 1_750_000_000
+DAY = 86400
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    # Archives, HTML pages and the database are written relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(generate_html_page, 'PAGE_SIZE', 10)
+    monkeypatch.setattr(generate_html_page.image_cache, 'IMAGE_CACHE_ENABLED', False)
+    storage.setup_database()
+    conn = storage.connect()
+    yield conn
+    conn.close()
+
+def add_articles(conn, count, published_at, prefix):
+    with conn:
+        conn.executemany('''
+            INSERT INTO articles (title, link, description, publication_date, published_at, content_url,
+                                  sent_to_discord, source)
+            VALUES (?, ?, '', '', ?, 'No Image', 1, ?)
+        ''', [(f'{prefix} headline {i}', f'https://{prefix}/{i}', published_at + i, 'Coindesk' if i % 2 else 'Decrypt')
+              for i in range(count)])
+
+def page_articles(source, page):
+    with open(generate_html_page.page_path(source, page), encoding='utf-8') as file:
+        return file.read().count(' headline ')
+
+def test_retention_keeps_search_and_archive_pages(conn):
+    add_articles(conn, 25, NOW - 200 * DAY, 'oldnews')
+    add_articles(conn, 5, NOW - DAY, 'recent')
+    assert generate_html_page.build_site(conn)
+    first_page = os.stat(generate_html_page.page_path(None, 1)).st_mtime_ns
+
+    assert retention.run_retention(conn, now=NOW) == 25
+    assert conn.execute('SELECT COUNT(*) FROM articles').fetchone()[0] == 5
+    # Nothing a reader can see changed, so nothing is rebuilt
+    assert not generate_html_page.build_site(conn)
+
+    add_articles(conn, 1, NOW, 'fresh')
+    assert generate_html_page.build_site(conn)
+    assert os.stat(generate_html_page.page_path(None, 1)).st_mtime_ns == first_page
+    assert [page_articles(None, page) for page in (1, 2, 3, 4)] == [10, 10, 10, 1]
+
+    results, _ = search.search(conn, 'oldnews headline')
+    assert len(results) == 20  # DEFAULT_LIMIT, the rest are on the next page
+    results, _ = search.search(conn, 'oldnews', source='Decrypt', limit=50)
+    assert len(results) == 13
@@ -0,0 +1,30 @@
+import sqlite3
+
+import pytest
+
+import search
+import storage
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage.setup_database()
+    conn = storage.connect()
+    with conn:
+        conn.execute('''
+            INSERT INTO articles (title, link, description, publication_date, published_at, content_url, source)
+            VALUES ('Bitcoin ETF inflows', 'https://example.com/1', '', '', 1750000000, 'No Image', 'Coindesk')
+        ''')
+    yield conn
+    conn.close()
+
+@pytest.mark.parametrize('query', ['', '!!!', '   '])
+def test_query_without_words_finds_nothing(conn, query):
+    assert search.search(conn, query) == ([], None)
+
+def test_malformed_input_raises(conn):
+    assert len(search.search(conn, 'bitcoin')[0]) == 1
+    with pytest.raises(sqlite3.OperationalError):
+        search.search(conn, '"unbalanced', raw=True)
+    with pytest.raises(ValueError):
+        search.search(conn, 'bitcoin', cursor='bad')
@@ -0,0 +1,40 @@
+import feedparser
+import pytest
+
+import streaming_feed
+
+RSS = ('<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/"><channel><title>Feed</title>'
+       '{items}</channel></rss>')
+ATOM = '<feed xmlns="http://www.w3.org/2005/Atom"><title>Feed</title>{items}</feed>'
+
+DOCUMENTS = {
+    'rss content before description': RSS.format(items=(
+        '<item><title>First</title><link>https://example.com/1</link>'
+        '<content:encoded><![CDATA[<p>FULL BODY</p>]]></content:encoded><description>summary</description>'
+        '<pubDate>Fri, 12 Jan 2024 13:47:21 +0000</pubDate></item>')),
+    'rss description before content': RSS.format(items=(
+        '<item><title>First</title><link>https://example.com/1</link><description>summary</description>'
+        '<content:encoded>FULL BODY</content:encoded></item>')),
+    'rss content only': RSS.format(items=(
+        '<item><title>First</title><link>https://example.com/1</link>'
+        '<content:encoded>FULL BODY</content:encoded></item>')),
+    'rss several items': RSS.format(items=''.join(
+        f'<item><title>Item {i}</title><link>https://example.com/{i}</link><description>About {i}</description>'
+        f'<pubDate>Fri, 12 Jan 2024 1{i}:00:00 GMT</pubDate></item>' for i in range(3))),
+    'atom content before summary': ATOM.format(items=(
+        '<entry><title>First</title><link href="https://example.com/1"/><content>FULL BODY</content>'
+        '<summary>summary</summary><published>2024-01-12T13:47:21Z</published></entry>')),
+    'atom content only': ATOM.format(items=(
+        '<entry><title>First</title><link href="https://example.com/1"/><content>FULL BODY</content></entry>')),
+}
+
+@pytest.mark.parametrize('name', DOCUMENTS)
+def test_entries_match_feedparser(name):
+    document = DOCUMENTS[name].encode('utf-8')
+    expected = [{key: entry.get(key) for key in ('title', 'link', 'description', 'published')}
+                for entry in feedparser.parse(document).entries]
+    # Split the document so elements straddle chunk boundaries
+    chunks = [document[i:i + 7] for i in range(0, len(document), 7)]
+    streamed = [{key: entry.get(key) for key in ('title', 'link', 'description', 'published')}
+                for entry in streaming_feed.iter_entries(chunks, {})]
+    assert streamed == expected
@@ -0,0 +1,36 @@
+import pytest
+
+import tagging
+
+MATCHER = tagging.CoinMatcher(tagging.DEFAULT_COINS)
+
+@pytest.mark.parametrize('text, coins', [
+    ('An avalanche of liquidations hits the market', set()),
+    ('A ripple effect on tron and polygon markets', set()),
+    ('Ripple wins its case against the SEC', {'XRP'}),
+    ('Avalanche (AVAX) rallies as Polygon ships an upgrade', {'AVAX', 'MATIC'}),
+])
+def test_ambiguous_names_match_only_capitalized(text, coins):
+    assert MATCHER.coins(text) == coins
+
+@pytest.mark.parametrize('text, coins', [
+    ('Bitcoin and Ethereum rally', {'BTC', 'ETH'}),
+    ('BITCOIN hits a new high', {'BTC'}),
+    ('Bitcoin Cash forks again', {'BCH'}),
+    ('Bitcoin, not Bitcoin Cash', {'BTC', 'BCH'}),
+    ('ETH/BTC ratio drops', {'ETH', 'BTC'}),
+    ('Traders buy $sol and $link', {'SOL', 'LINK'}),
+    ('Click the link to read more', set()),
+    ('Solana-based memecoins', {'SOL'}),
+    ('Bitcoiners celebrate', set()),
+    ('ETHBTC and the ETHEREUM merge', {'ETH'}),
+    ('<a href="https://example.com/bitcoin">read</a> the news', set()),
+    ('', set()),
+])
+def test_coins(text, coins):
+    assert MATCHER.coins(tagging.article_text(text, None)) == coins
+
+def test_custom_dictionary():
+    matcher = tagging.CoinMatcher({'PEPE': {'names': ['pepe'], 'tickers': ['PEPE']}})
+    assert matcher.coins('Pepe soars') == {'PEPE'}
+    assert matcher.coins('Bitcoin soars') == set()